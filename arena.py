@@ -0,0 +1,100 @@
+from core import TILE_SIZE, ACTION_MOVE, PLAYER_LIVES, Tank, World
+
+# Кооперативная арена для сетевой игры: несколько игроков на одной карте
+# против общих врагов. Игроки занимают слоты 0..max_players-1 и могут
+# входить и выходить посреди раунда. Счет и запас жизней общие: по
+# PLAYER_LIVES за каждый слот, занятый в раунде хотя бы раз, так что
+# переподключением жизни не набрать. Политики врагов видят как цель
+# world.player - игрока с меньшим номером слота, а без игроков - пустой
+# танк на точке появления.
+
+# Смещения в клетках для поиска свободного места рядом с точкой появления
+SPAWN_OFFSETS = [(0, 0)] + [(dc, dr) for radius in (2, 4, 6)
+                            for dr in range(-radius, radius + 1, 2) for dc in range(-radius, radius + 1, 2)
+                            if max(abs(dc), abs(dr)) == radius]
+
+class Arena(World):
+    def __init__(self, max_players=4, **kwargs):
+        super().__init__(**kwargs)
+        self.max_players = max_players
+        # слот -> танк игрока и предыдущая маска ввода слота
+        self.slots = {}
+        self.prev_slot_actions = {}
+        # Слоты, уже принесшие жизни в этом раунде
+        self.paid_slots = set()
+        self.spawn_point = (0, 0)
+        self.spawn_tank = None
+
+    def reset(self, seed=None, level=None):
+        slots = sorted(self.slots)
+        self.slots = {}
+        super().reset(seed, level)
+        self.spawn_point = (self.spawn_tank.x, self.spawn_tank.y)
+        for slot in slots:
+            self.spawn(slot)
+        self.paid_slots = set(self.slots)
+        self.player_lives = PLAYER_LIVES * len(self.slots)
+        self.update_roster()
+
+    def number_tanks(self):
+        # Номера игроков совпадают со слотами, враги идут после всех слотов.
+        # Танк игрока из уровня служит только точкой появления и целью врагов без игроков
+        self.spawn_tank = self.player
+        self.player.id = 0
+        for i, enemy in enumerate(self.enemies):
+            enemy.id = self.max_players + i
+        self.update_roster()
+
+    def update_roster(self):
+        self.players = [self.slots[slot] for slot in sorted(self.slots)]
+        self.player = self.players[0] if self.players else self.spawn_tank
+        self.tank_index.rebuild(self.players + self.enemies)
+
+    def spawn(self, slot):
+        tank = Tank(*self.spawn_point, True)
+        tank.id = slot
+        others = list(self.slots.values()) + self.enemies
+        x0, y0 = self.spawn_point
+        for dc, dr in SPAWN_OFFSETS:
+            tank.x = x0 + dc * TILE_SIZE
+            tank.y = y0 + dr * TILE_SIZE
+            if (0 <= tank.x <= self.width - tank.width and 0 <= tank.y <= self.height - tank.height and
+                    not self.check_tank_wall_collision(tank) and
+                    not any(tank.collides_with(other) for other in others)):
+                break
+        else:
+            tank.x, tank.y = x0, y0
+        self.slots[slot] = tank
+        self.prev_slot_actions[slot] = 0
+        return tank
+
+    def join(self):
+        # Номер свободного слота или None, если арена заполнена
+        for slot in range(self.max_players):
+            if slot not in self.slots:
+                self.spawn(slot)
+                if slot not in self.paid_slots:
+                    self.paid_slots.add(slot)
+                    self.player_lives += PLAYER_LIVES
+                self.update_roster()
+                return slot
+        return None
+
+    def leave(self, slot):
+        self.slots.pop(slot, None)
+        self.prev_slot_actions.pop(slot, None)
+        self.update_roster()
+
+    def update_players(self, actions):
+        # actions - словарь слот -> маска ввода; слоты без записи стоят на месте
+        masks = []
+        for slot in sorted(self.slots):
+            mask = actions.get(slot, 0)
+            self.press(self.slots[slot], mask & ~self.prev_slot_actions[slot])
+            self.prev_slot_actions[slot] = mask
+            masks.append(mask)
+        self.tank_index.rebuild(self.players + self.enemies)
+
+        for tank, mask in zip(self.players, masks):
+            if mask & ACTION_MOVE:
+                self.move_player(tank)
@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from core import TILE_SIZE, EMPTY, BRICK, STEEL, FOREST, WATER, Tank, World
+from snapshot import SnapshotRing
+
+# Набор нагрузочных сценариев с порогами регрессии.
+# Каждый сценарий замеряется в двух режимах: только логика (update) и
+# логика с отрисовкой в невидимое окно (render, драйвер SDL dummy).
+# Режим snapshot - логика со снимком состояния в кольцевой буфер каждый тик.
+# Результаты сравниваются с сохраненной базой: если тиков в секунду стало
+# меньше базы больше чем на допуск, скрипт завершается с кодом 1.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(ROOT, 'bench_baseline.json')
+
+# Холодный старт отдельными процессами: до готового мира без окна и до первого кадра игры
+STARTUP_COMMANDS = {
+    'headless': [sys.executable, '-c', 'from core import World; World().reset(0)'],
+    'window': [sys.executable, 'main.py', '--startup-check'],
+}
+
+SCENARIOS = {
+    # name: размер карты в клетках, врагов, доля кирпича, прочих стен, пуль в полете
+    'classic': dict(cols=26, rows=26, enemies=4, bricks=None, walls=None, bullets=0),
+    'enemies_64': dict(cols=26, rows=26, enemies=64, bricks=0.05, walls=0.05, bullets=0),
+    'enemies_512': dict(cols=96, rows=96, enemies=512, bricks=0.05, walls=0.05, bullets=0),
+    'dense_bricks': dict(cols=26, rows=26, enemies=16, bricks=0.6, walls=0.0, bullets=64),
+    'bullets_2000': dict(cols=26, rows=26, enemies=16, bricks=0.1, walls=0.05, bullets=2000),
+    'map_256': dict(cols=256, rows=256, enemies=64, bricks=0.2, walls=0.1, bullets=256),
+}
+
+def build_scenario(spec, seed):
+    world = World(spec['cols'], spec['rows'])
+    world.reset(seed)
+    # Игрок бессмертен, чтобы сценарий не закончился посреди замера
+    world.player_lives = 10 ** 9
+    if spec['bricks'] is None:
+        return world
+
+    rng = random.Random(seed)
+    grid = world.grid
+    grid.reset()
+    for col in range(grid.cols):
+        grid.set(col, 0, STEEL)
+        grid.set(col, grid.rows - 1, STEEL)
+    for row in range(grid.rows):
+        grid.set(0, row, STEEL)
+        grid.set(grid.cols - 1, row, STEEL)
+    for row in range(1, grid.rows - 1):
+        for col in range(1, grid.cols - 1):
+            roll = rng.random()
+            if roll < spec['bricks']:
+                grid.set(col, row, BRICK)
+            elif roll < spec['bricks'] + spec['walls']:
+                grid.set(col, row, rng.choice((STEEL, FOREST, WATER)))
+
+    # Танки ставятся в свободные ячейки 2x2 клетки с шагом в 2 клетки
+    spots = []
+    for row in range(1, grid.rows - 2, 2):
+        for col in range(1, grid.cols - 2, 2):
+            spots.append((col, row))
+    rng.shuffle(spots)
+    tanks = []
+    for col, row in spots:
+        if len(tanks) == spec['enemies'] + 1:
+            break
+        for c, r in ((col, row), (col + 1, row), (col, row + 1), (col + 1, row + 1)):
+            grid.set(c, r, EMPTY)
+        tanks.append(Tank(col * TILE_SIZE, row * TILE_SIZE, is_player=not tanks))
+    world.player = tanks[0]
+    world.enemies = tanks[1:]
+    world.number_tanks()
+    return world
+
+def refill_bullets(world, target, rng):
+    # Поддерживаем заданное число пуль: стреляют случайные враги
+    missing = target - world.bullets.count
+    enemies = world.enemies
+    for _ in range(missing):
+        shooter = rng.choice(enemies)
+        shooter.direction = rng.randint(0, 3)
+        world.shoot_bullet(shooter, False)
+
+def make_renderer():
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    import main
+    import pygame
+    screen = pygame.display.set_mode((main.SCREEN_WIDTH, main.SCREEN_HEIGHT))
+    return main.Renderer(screen), pygame
+
+def run_scenario(name, spec, render, seconds, seed, snapshots=False):
+    world = build_scenario(spec, seed)
+    ring = SnapshotRing(60) if snapshots else None
+    rng = random.Random(seed)
+    renderer = None
+    if render:
+        renderer, pygame = make_renderer()
+        renderer.rebuild(world.grid)
+        world.grid.listeners.append(renderer.on_tile_cleared)
+
+    def tick():
+        if spec['bullets']:
+            refill_bullets(world, spec['bullets'], rng)
+        world.step(0)
+        if ring is not None:
+            ring.push(world)
+        if renderer is not None:
+            renderer.draw(world)
+            pygame.display.flip()
+
+    # Прогрев, затем замер по времени
+    for _ in range(30):
+        tick()
+    ticks = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while True:
+        tick()
+        ticks += 1
+        if ticks % 16 == 0 and time.perf_counter() >= deadline:
+            break
+    elapsed = time.perf_counter() - start
+
+    # Выделения памяти за тик: пик tracemalloc относительно начала тика
+    tracemalloc.start()
+    allocated = 0
+    samples = 50
+    for _ in range(samples):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        tick()
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    return {
+        'ticks_per_sec': round(ticks / elapsed, 1),
+        'ms_per_tick': round(elapsed / ticks * 1000.0, 4),
+        'alloc_bytes_per_tick': allocated // samples,
+        'enemies': len(world.enemies),
+        'bullets': world.bullets.count,
+    }
+
+def measure_startup(runs):
+    env = dict(os.environ)
+    env.setdefault('SDL_VIDEODRIVER', 'dummy')
+    env.setdefault('SDL_AUDIODRIVER', 'dummy')
+    print(f'{"старт":<24}{"медиана мс":>12}{"мин мс":>10}')
+    for name, command in STARTUP_COMMANDS.items():
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, check=True)
+            times.append(time.perf_counter() - start)
+        print(f'{name:<24}{statistics.median(times) * 1000:>12.1f}{min(times) * 1000:>10.1f}', flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочные сценарии и проверка регрессий')
+    parser.add_argument('scenarios', nargs='*', help=f'сценарии (по умолчанию все: {", ".join(SCENARIOS)})')
+    parser.add_argument('--mode', choices=('update', 'render', 'snapshot', 'both'), default='both')
+    parser.add_argument('--seconds', type=float, default=1.0, help='длительность замера одного сценария')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='файл с базовыми результатами')
+    parser.add_argument('--save-baseline', action='store_true', help='записать результаты как новую базу')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='допустимое падение тиков/с относительно базы')
+    parser.add_argument('--startup', type=int, metavar='RUNS', default=None,
+                        help='вместо сценариев замерить холодный старт RUNS запусками')
+    args = parser.parse_args()
+
+    if args.startup:
+        measure_startup(args.startup)
+        return
+
+    names = args.scenarios or list(SCENARIOS)
+    for name in names:
+        if name not in SCENARIOS:
+            parser.error(f'неизвестный сценарий: {name}')
+    modes = ('update', 'render') if args.mode == 'both' else (args.mode,)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = []
+    print(f'{"сценарий":<24}{"тиков/с":>10}{"мс/тик":>10}{"байт/тик":>10}{"база":>10}')
+    for name in names:
+        for mode in modes:
+            key = f'{name}/{mode}'
+            result = run_scenario(name, SCENARIOS[name], mode == 'render', args.seconds, args.seed,
+                                  mode == 'snapshot')
+            results[key] = result
+            base = baseline.get(key, {}).get('ticks_per_sec')
+            line = (f'{key:<24}{result["ticks_per_sec"]:>10.0f}{result["ms_per_tick"]:>10.3f}'
+                    f'{result["alloc_bytes_per_tick"]:>10}{base if base else "-":>10}')
+            if base and not args.save_baseline and result['ticks_per_sec'] < base * (1.0 - args.tolerance):
+                regressions.append(key)
+                line += '  РЕГРЕССИЯ'
+            print(line, flush=True)
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+        print(f'база сохранена: {args.baseline}')
+
+    if regressions:
+        print(f'регрессии: {", ".join(regressions)}', file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
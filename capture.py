@@ -0,0 +1,197 @@
+import argparse
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+# Запись игровых сессий для QA. Основной цикл только копирует байты
+# показанного кадра в свободный буфер из заранее выделенного кольца и
+# отдает его фоновому потоку; поток кодирует кадры и пишет в файл. Если
+# кодировщик не успевает и свободных буферов нет, кадр пропускается и
+# учитывается в счетчике пропусков.
+#
+# Формат файла: заголовок (magic, версия, размеры кадра, строка в байтах,
+# байт на пиксель, маски каналов), затем записи "тип, номер кадра, время,
+# длина" с данными, сжатыми zlib. Ключевой кадр - сырые байты поверхности,
+# разностный - XOR с предыдущим кадром: на экране меняется немного, и
+# XOR почти весь из нулей. Последняя запись - итог: записано и пропущено.
+
+CAPTURE_MAGIC = b'BCCP'
+CAPTURE_VERSION = 1
+# magic, версия, ширина, высота, байт в строке, байт на пиксель, маски R, G, B, A
+CAPTURE_HEADER = struct.Struct('<4sBHHIB4I')
+# тип записи, номер кадра, время от начала записи, длина данных
+RECORD = struct.Struct('<BIdI')
+TOTALS = struct.Struct('<II')
+
+RECORD_KEY = 1
+RECORD_DELTA = 2
+RECORD_END = 3
+
+CAPTURE_SLOTS = 8
+# Ключевой кадр раз в столько кадров, чтобы файл можно было читать не с начала
+KEYFRAME_INTERVAL = 120
+ZLIB_LEVEL = 1
+
+class CaptureError(Exception):
+    pass
+
+class FrameCapture:
+    def __init__(self, path, surface, slots=CAPTURE_SLOTS):
+        self.path = path
+        self.width, self.height = surface.get_size()
+        self.pitch = surface.get_pitch()
+        self.bytesize = surface.get_bytesize()
+        size = self.pitch * self.height
+        self.buffers = [np.empty(size, dtype=np.uint8) for _ in range(slots)]
+        self.free = queue.SimpleQueue()
+        for index in range(slots):
+            self.free.put(index)
+        self.filled = queue.SimpleQueue()
+
+        # Счетчики: кадры, пропуски и время основного цикла на захват
+        self.frames = 0
+        self.dropped = 0
+        self.grab_seconds = 0.0
+        self.written = 0
+        self.started = time.perf_counter()
+
+        self.file = open(path, 'wb')
+        self.file.write(CAPTURE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, self.width, self.height, self.pitch,
+                                            self.bytesize, *surface.get_masks()))
+        self.thread = threading.Thread(target=self.encode, name='capture-encoder', daemon=True)
+        self.thread.start()
+
+    def grab(self, surface):
+        start = time.perf_counter()
+        frame = self.frames
+        self.frames += 1
+        try:
+            index = self.free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+        else:
+            # Буфер поверхности держит ее заблокированной, отпускаем сразу после копии
+            view = surface.get_buffer()
+            np.copyto(self.buffers[index], np.frombuffer(view, dtype=np.uint8))
+            del view
+            self.filled.put((index, frame, start - self.started))
+        self.grab_seconds += time.perf_counter() - start
+
+    def encode(self):
+        # Фоновый поток: XOR и zlib отпускают GIL на больших буферах
+        previous = np.zeros_like(self.buffers[0])
+        delta = np.empty_like(previous)
+        write = self.file.write
+        while True:
+            item = self.filled.get()
+            if item is None:
+                break
+            index, frame, seconds = item
+            buffer = self.buffers[index]
+            if self.written % KEYFRAME_INTERVAL == 0:
+                kind = RECORD_KEY
+                data = zlib.compress(buffer, ZLIB_LEVEL)
+            else:
+                kind = RECORD_DELTA
+                np.bitwise_xor(buffer, previous, out=delta)
+                data = zlib.compress(delta, ZLIB_LEVEL)
+            np.copyto(previous, buffer)
+            self.free.put(index)
+            write(RECORD.pack(kind, frame, seconds, len(data)))
+            write(data)
+            self.written += 1
+
+    def close(self):
+        self.filled.put(None)
+        self.thread.join()
+        totals = TOTALS.pack(self.written, self.dropped)
+        self.file.write(RECORD.pack(RECORD_END, self.frames, time.perf_counter() - self.started, len(totals)))
+        self.file.write(totals)
+        self.file.close()
+
+    def report(self):
+        frames = max(self.frames, 1)
+        return (f'захват: кадров {self.frames}, пропущено {self.dropped}, '
+                f'в основном цикле {self.grab_seconds / frames * 1000:.3f} мс/кадр, '
+                f'файл {os.path.getsize(self.path) / (1 << 20):.1f} МБ')
+
+def read_capture(path):
+    # Заголовок и генератор (номер кадра, время, байты кадра); итог - в info['totals']
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < CAPTURE_HEADER.size:
+        raise CaptureError('файл короче заголовка')
+    magic, version, width, height, pitch, bytesize, *masks = CAPTURE_HEADER.unpack_from(data)
+    if magic != CAPTURE_MAGIC or version != CAPTURE_VERSION:
+        raise CaptureError(f'не файл захвата или неизвестная версия: {path}')
+    info = {'width': width, 'height': height, 'pitch': pitch, 'bytesize': bytesize, 'masks': masks,
+            'totals': None}
+
+    def frames():
+        offset = CAPTURE_HEADER.size
+        frame = None
+        while offset < len(data):
+            kind, number, seconds, length = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            payload = data[offset:offset + length]
+            offset += length
+            if len(payload) != length:
+                raise CaptureError('обрезанная запись')
+            if kind == RECORD_END:
+                info['totals'] = (number,) + TOTALS.unpack(payload)
+                return
+            raw = np.frombuffer(zlib.decompress(payload), dtype=np.uint8)
+            if kind == RECORD_KEY:
+                frame = raw.copy()
+            elif frame is None:
+                raise CaptureError('разностный кадр до первого ключевого')
+            else:
+                frame ^= raw
+            yield number, seconds, frame
+    return info, frames()
+
+def export_frames(info, frames, directory):
+    # Кадры в PNG для просмотра; нужен pygame
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    import pygame
+    os.makedirs(directory, exist_ok=True)
+    surface = pygame.Surface((info['width'], info['height']), 0, info['bytesize'] * 8, info['masks'])
+    if surface.get_pitch() != info['pitch']:
+        raise CaptureError('шаг строк кадра не совпадает с поверхностью этой платформы')
+    count = 0
+    for number, seconds, frame in frames:
+        surface.get_buffer().write(frame.tobytes())
+        pygame.image.save(surface, os.path.join(directory, f'{number:06d}.png'))
+        count += 1
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description='Просмотр и выгрузка записи сессии')
+    parser.add_argument('path')
+    parser.add_argument('--export', metavar='DIR', default=None, help='сохранить кадры в PNG')
+    args = parser.parse_args()
+
+    info, frames = read_capture(args.path)
+    print(f'кадр {info["width"]}x{info["height"]}, {info["bytesize"]} байт на пиксель')
+    if args.export:
+        print(f'выгружено кадров: {export_frames(info, frames, args.export)}')
+    else:
+        count = 0
+        last = 0.0
+        for number, seconds, frame in frames:
+            count += 1
+            last = seconds
+        print(f'записей: {count}, длительность: {last:.1f} с')
+    if info['totals'] is None:
+        print('нет итоговой записи: захват не был закрыт')
+    else:
+        frames_total, written, dropped = info['totals']
+        print(f'кадров: {frames_total}, записано: {written}, пропущено: {dropped}')
+
+if __name__ == '__main__':
+    main()
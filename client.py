@@ -0,0 +1,151 @@
+import argparse
+import asyncio
+import sys
+import time
+
+from arena import Arena
+from net import FRAME, MSG_DELTA, Mirror, read_frame
+from policies import PLAYER_POLICIES, ENEMY_POLICIES
+from server import Server
+
+# Клиент сетевой игры. Без --bots открывает окно и управляется с клавиатуры,
+# с --bots N запускает N безголовых ботов с политикой игрока из policies.
+# --local поднимает сервер в этом же процессе - для проверки на одной машине.
+
+async def run_bot(host, port, policy_name, seed, ticks):
+    reader, writer = await asyncio.open_connection(host, port)
+    mirror = Mirror()
+    policy = PLAYER_POLICIES[policy_name](seed)
+    last_mask = None
+    received = 0
+    deltas = 0
+    try:
+        while ticks is None or deltas < ticks:
+            kind, payload = await read_frame(reader)
+            received += FRAME.size + len(payload)
+            mirror.apply(kind, payload)
+            if kind != MSG_DELTA:
+                continue
+            deltas += 1
+            if mirror.player is None or mirror.done:
+                continue
+            mask = policy(mirror)
+            # Сервер помнит последнюю маску, повторять ее не нужно
+            if mask != last_mask:
+                writer.write(bytes([mask]))
+                last_mask = mask
+    except asyncio.IncompleteReadError:
+        pass
+    finally:
+        writer.close()
+    return received, deltas
+
+async def receive(reader, mirror, state):
+    while True:
+        kind, payload = await read_frame(reader)
+        mirror.apply(kind, payload)
+        if kind == MSG_DELTA:
+            state['arrival'] = time.perf_counter()
+
+async def run_viewer(host, port):
+    import pygame
+    from core import GAME_HEIGHT
+    from main import WHITE, BLACK, RED, GREEN, SCREEN_WIDTH, SCREEN_HEIGHT, Game, Renderer, fonts
+
+    reader, writer = await asyncio.open_connection(host, port)
+    mirror = Mirror()
+    state = {'arrival': time.perf_counter()}
+    receiver = asyncio.create_task(receive(reader, mirror, state))
+
+    pygame.display.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Battle City - сетевая игра")
+    renderer = Renderer(screen)
+    mirror.grid.listeners.append(renderer.on_tile_cleared)
+    generation = None
+    held = 0
+    sent = None
+    frame_time = 1.0 / 60
+
+    try:
+        running = True
+        while running and not receiver.done():
+            started = time.perf_counter()
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type == pygame.KEYDOWN:
+                    held |= Game.KEY_ACTIONS.get(event.key, 0)
+                elif event.type == pygame.KEYUP:
+                    held &= ~Game.KEY_ACTIONS.get(event.key, 0)
+            if held != sent:
+                writer.write(bytes([held]))
+                sent = held
+
+            # Новая карта пришла целиком - кэш чанков строим заново
+            if mirror.grid.generation != generation:
+                renderer.rebuild(mirror.grid)
+                generation = mirror.grid.generation
+
+            screen.fill(BLACK)
+            if mirror.player is not None:
+                # Между снимками танки плавно доезжают, пули летят по своей формуле
+                alpha = min(1.0, (started - state['arrival']) * mirror.tick_rate)
+                renderer.draw(mirror, alpha=alpha)
+            pygame.draw.rect(screen, (50, 50, 50), (0, 0, SCREEN_WIDTH, 50))
+            screen.blit(fonts.render('Arial', 36, f'Очки: {mirror.score}', WHITE), (10, 10))
+            screen.blit(fonts.render('Arial', 36, f'Жизни: {mirror.player_lives}', WHITE), (SCREEN_WIDTH - 150, 10))
+            screen.blit(fonts.render('Arial', 36, f'Игроков: {len(mirror.players)}', WHITE), (SCREEN_WIDTH // 2 - 80, 10))
+            if mirror.done:
+                text = fonts.render('Arial', 36, 'ПОБЕДА!' if mirror.game_won else 'ИГРА ОКОНЧЕНА',
+                                    GREEN if mirror.game_won else RED)
+                screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, GAME_HEIGHT // 2))
+            pygame.display.flip()
+
+            await asyncio.sleep(max(0.0, frame_time - (time.perf_counter() - started)))
+    finally:
+        receiver.cancel()
+        writer.close()
+        pygame.quit()
+
+async def run(args):
+    server = None
+    if args.local:
+        arena = Arena(max(args.bots, 1), enemy_policy=ENEMY_POLICIES[args.enemy])
+        server = Server(arena, seed=args.seed)
+        listener = await asyncio.start_server(server.handle, args.host, args.port)
+        server_task = asyncio.create_task(server.run())
+
+    try:
+        if args.bots:
+            results = await asyncio.gather(*[
+                run_bot(args.host, args.port, args.policy, args.seed + i, args.ticks) for i in range(args.bots)])
+            for i, (received, deltas) in enumerate(results):
+                print(f'бот {i}: {deltas} снимков, {received / max(deltas, 1):.1f} байт/тик', file=sys.stderr)
+        else:
+            await run_viewer(args.host, args.port)
+    finally:
+        if server is not None:
+            server_task.cancel()
+            listener.close()
+            print(server.report(), file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description='Клиент сетевой игры')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('--bots', type=int, default=0, help='число безголовых ботов вместо окна')
+    parser.add_argument('--policy', choices=sorted(PLAYER_POLICIES), default='hunter', help='политика ботов')
+    parser.add_argument('--ticks', type=int, default=None, help='сколько снимков играют боты')
+    parser.add_argument('--local', action='store_true', help='запустить сервер в этом же процессе')
+    parser.add_argument('--enemy', choices=sorted(ENEMY_POLICIES), default='random', help='политика врагов для --local')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run(args))
+    except (KeyboardInterrupt, ConnectionError):
+        pass
+
+if __name__ == '__main__':
+    main()
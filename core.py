@@ -0,0 +1,828 @@
+import random
+from bisect import bisect_left, bisect_right
+import struct
+import zlib
+
+import numpy as np
+
+# Ядро симуляции: танки, пули, стены, очки и условия победы/поражения.
+# Модуль не зависит от pygame и работает без окна, звука и шрифтов.
+
+# Константы игры
+TILE_SIZE = 16
+GAME_WIDTH = 416
+GAME_HEIGHT = 416
+
+TANK_SIZE = TILE_SIZE * 3 // 2
+BULLET_SIZE = 6
+BULLET_SPEED = 5
+PLAYER_SPEED = 2
+ENEMY_SPEED = 1
+PLAYER_LIVES = 3
+ENEMY_SCORE = 100
+
+# Типы клеток поля
+EMPTY = 0
+BRICK = 1
+STEEL = 2
+FOREST = 3
+WATER = 4
+
+TILE_TYPES = {'brick': BRICK, 'steel': STEEL, 'forest': FOREST, 'water': WATER}
+TILE_NAMES = {tile: name for name, tile in TILE_TYPES.items()}
+
+# Таблицы проходимости: индекс - тип клетки, 1 - клетка останавливает объект
+TANK_BLOCKING = bytes([0, 1, 1, 0, 1])
+BULLET_BLOCKING = bytes([0, 1, 1, 0, 0])
+
+# Биты маски ввода: направление d соответствует биту 1 << d
+ACTION_UP = 1
+ACTION_RIGHT = 2
+ACTION_DOWN = 4
+ACTION_LEFT = 8
+ACTION_FIRE = 16
+ACTION_MOVE = ACTION_UP | ACTION_RIGHT | ACTION_DOWN | ACTION_LEFT
+
+# Классический уровень 26x26 (без стальной рамки)
+CLASSIC_LEVEL = [
+    # Кирпичные стены в центре
+    [10, 5, 'brick'], [11, 5, 'brick'], [12, 5, 'brick'], [13, 5, 'brick'], [14, 5, 'brick'],
+    [10, 6, 'brick'], [14, 6, 'brick'],
+    [10, 7, 'brick'], [14, 7, 'brick'],
+    [10, 8, 'brick'], [11, 8, 'brick'], [12, 8, 'brick'], [13, 8, 'brick'], [14, 8, 'brick'],
+
+    # Стальные стены
+    [5, 10, 'steel'], [6, 10, 'steel'], [7, 10, 'steel'],
+    [5, 11, 'steel'], [7, 11, 'steel'],
+    [5, 12, 'steel'], [6, 12, 'steel'], [7, 12, 'steel'],
+
+    [18, 10, 'steel'], [19, 10, 'steel'], [20, 10, 'steel'],
+    [18, 11, 'steel'], [20, 11, 'steel'],
+    [18, 12, 'steel'], [19, 12, 'steel'], [20, 12, 'steel'],
+
+    # Лес
+    [8, 15, 'forest'], [9, 15, 'forest'], [10, 15, 'forest'], [11, 15, 'forest'],
+    [8, 16, 'forest'], [9, 16, 'forest'], [10, 16, 'forest'], [11, 16, 'forest'],
+    [8, 17, 'forest'], [9, 17, 'forest'], [10, 17, 'forest'], [11, 17, 'forest'],
+
+    # Вода
+    [14, 15, 'water'], [15, 15, 'water'], [16, 15, 'water'], [17, 15, 'water'],
+    [14, 16, 'water'], [15, 16, 'water'], [16, 16, 'water'], [17, 16, 'water'],
+    [14, 17, 'water'], [15, 17, 'water'], [16, 17, 'water'], [17, 17, 'water']
+]
+
+CLASSIC_PLAYER = (12, 22)
+CLASSIC_ENEMIES = [(3, 3), (22, 3), (3, 22), (22, 22)]
+
+def rects_overlap(ax, ay, aw, ah, bx, by, bw, bh):
+    # То же, что pygame.Rect.colliderect, но без создания объектов
+    return ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
+
+class TileGrid:
+    def __init__(self, cols, rows):
+        self.cols = cols
+        self.rows = rows
+        self.tiles = bytearray(cols * rows)
+        # Подписчики на разрушение клеток: fn(col, row, old_tile)
+        self.listeners = []
+        # Растет при каждой смене карты целиком; по нему кэши, построенные
+        # по сетке, понимают, что их пора пересобрать
+        self.generation = 0
+
+    def reset(self):
+        self.tiles[:] = bytes(len(self.tiles))
+        self.generation += 1
+
+    def resize(self, cols, rows):
+        # Объект сетки остается тем же, чтобы не терять подписчиков
+        self.cols = cols
+        self.rows = rows
+        self.tiles = bytearray(cols * rows)
+        self.generation += 1
+
+    def load(self, tiles):
+        self.tiles[:] = tiles
+        self.generation += 1
+
+    def get(self, col, row):
+        return self.tiles[row * self.cols + col]
+
+    def set(self, col, row, tile):
+        self.tiles[row * self.cols + col] = tile
+
+    def clear(self, col, row):
+        index = row * self.cols + col
+        old_tile = self.tiles[index]
+        self.tiles[index] = EMPTY
+        for listener in self.listeners:
+            listener(col, row, old_tile)
+
+    def find_blocking(self, x, y, width, height, blocking):
+        # Проверяются только клетки, которые перекрывает прямоугольник
+        col0 = max(0, int(x) // TILE_SIZE)
+        row0 = max(0, int(y) // TILE_SIZE)
+        col1 = min(self.cols - 1, (int(x) + int(width) - 1) // TILE_SIZE)
+        row1 = min(self.rows - 1, (int(y) + int(height) - 1) // TILE_SIZE)
+        tiles = self.tiles
+        cols = self.cols
+        for row in range(row0, row1 + 1):
+            base = row * cols
+            for col in range(col0, col1 + 1):
+                if blocking[tiles[base + col]]:
+                    return col, row
+        return None
+
+class Tank:
+    def __init__(self, x, y, is_player=False):
+        self.x = x
+        self.y = y
+        # Положение на предыдущем тике: между ними интерполируется отрисовка
+        self.prev_x = x
+        self.prev_y = y
+        self.width = TANK_SIZE
+        self.height = TANK_SIZE
+        self.speed = PLAYER_SPEED if is_player else ENEMY_SPEED
+        self.direction = 0  # 0: вверх, 1: вправо, 2: вниз, 3: влево
+        self.is_player = is_player
+        # Номер танка в мире, им помечаются его пули (назначает World.number_tanks)
+        self.id = 0
+        # Тик, начиная с которого танку разрешен следующий прицельный выстрел
+        self.reload_tick = 0
+
+    def move(self, max_x, max_y, steps=1):
+        old_x, old_y = self.x, self.y
+        distance = self.speed * steps
+
+        if self.direction == 0:  # вверх
+            self.y -= distance
+        elif self.direction == 1:  # вправо
+            self.x += distance
+        elif self.direction == 2:  # вниз
+            self.y += distance
+        elif self.direction == 3:  # влево
+            self.x -= distance
+
+        # Ограничение движения в пределах поля
+        self.x = max(0, min(max_x - self.width, self.x))
+        self.y = max(0, min(max_y - self.height, self.y))
+
+        return old_x, old_y
+
+    def collides_with(self, other):
+        return rects_overlap(self.x, self.y, self.width, self.height,
+                             other.x, other.y, other.width, other.height)
+
+# Враг считается дальним, если дальше этого расстояния от центра игрока
+# (примерно половина экрана за краем видимой области)
+FAR_ENEMY_DISTANCE_X = GAME_WIDTH
+FAR_ENEMY_DISTANCE_Y = GAME_HEIGHT
+FAR_ENEMY_PERIOD = 4
+
+# Смещение пули за тик по направлениям 0: вверх, 1: вправо, 2: вниз, 3: влево
+BULLET_DX = np.array([0, BULLET_SPEED, 0, -BULLET_SPEED], dtype=np.int32)
+BULLET_DY = np.array([-BULLET_SPEED, 0, BULLET_SPEED, 0], dtype=np.int32)
+BULLET_STEPS = list(zip(BULLET_DX.tolist(), BULLET_DY.tolist()))
+BULLET_BLOCKING_TABLE = np.frombuffer(BULLET_BLOCKING, dtype=np.uint8).astype(bool)
+# Смещения ближнего и дальнего угла пули по каждой оси
+BULLET_CORNERS = np.array([[0], [BULLET_SIZE - 1]], dtype=np.int32)
+
+# До этого числа пуль накладные расходы numpy больше выигрыша, и пули
+# обрабатываются обычным циклом по тем же массивам
+BULLET_BATCH_THRESHOLD = 32
+
+# Емкость пула пуль по умолчанию: пул выделяется один раз и не растет;
+# выстрел при заполненном пуле не происходит
+BULLET_CAPACITY = 4096
+
+class BulletStore:
+    # Все пули мира в виде структуры массивов; живые записи лежат в [0, count).
+    # Массивы и рабочие буферы выделяются один раз, поэтому тик не создает
+    # новых массивов: сжатие раскладывает живые пули через np.put во второй
+    # комплект массивов, после чего комплекты меняются местами. Проверки
+    # столкновений тоже пишут маски, номера клеток и номера пуль только в
+    # рабочие буферы; на Python-списки уходят лишь пули-кандидаты.
+    def __init__(self, capacity=BULLET_CAPACITY):
+        self.capacity = capacity
+        self.count = 0
+        # Сквозной номер выстрела: по нему пулю узнают между тиками (сетевые снимки)
+        self.next_serial = 0
+        self.x, self.y, self.direction, self.owner, self.serial, self.is_player, self.active = self.allocate()
+        self.back = self.allocate()
+        self.scratch_int = np.zeros(capacity, dtype=np.int32)
+        self.scratch_index = np.zeros(capacity, dtype=np.intp)
+        self.scratch_bool = np.zeros(capacity, dtype=bool)
+        # Для столкновений: столбцы и ряды углов пуль, номера и типы клеток
+        # под четырьмя углами, маски и выбранные номера пуль. Арифметика идет
+        # в int32, как координаты, а в intp индексы попадают через np.copyto:
+        # смешанные типы в ufunc и np.take заводят буферы приведения
+        self.scratch_axes = np.zeros(4 * capacity, dtype=np.int32)
+        self.scratch_cells = np.zeros(4 * capacity, dtype=np.int32)
+        self.scratch_corner_index = np.zeros(4 * capacity, dtype=np.intp)
+        self.scratch_tiles = np.zeros(4 * capacity, dtype=np.uint8)
+        self.scratch_corners = np.zeros(4 * capacity, dtype=bool)
+        self.scratch_masks = np.zeros((3, capacity), dtype=bool)
+        self.scratch_selected = np.zeros(capacity, dtype=np.intp)
+        self.positions = np.arange(capacity, dtype=np.intp)
+
+    def allocate(self):
+        capacity = self.capacity
+        return (np.zeros(capacity, dtype=np.int32), np.zeros(capacity, dtype=np.int32),
+                np.zeros(capacity, dtype=np.intp), np.zeros(capacity, dtype=np.int32),
+                np.zeros(capacity, dtype=np.int64), np.zeros(capacity, dtype=bool), np.zeros(capacity, dtype=bool))
+
+    def arrays(self):
+        return (self.x, self.y, self.direction, self.owner, self.serial, self.is_player, self.active)
+
+    def clear(self):
+        self.count = 0
+
+    def spawn(self, x, y, direction, is_player, owner=0):
+        if self.count == self.capacity:
+            return False
+        i = self.count
+        self.x[i] = x
+        self.y[i] = y
+        self.direction[i] = direction
+        self.owner[i] = owner
+        self.serial[i] = self.next_serial
+        self.next_serial += 1
+        self.is_player[i] = is_player
+        self.active[i] = True
+        self.count += 1
+        return True
+
+    def owned_by(self, owner):
+        # Число летящих пуль танка owner
+        n = self.count
+        if n == 0:
+            return 0
+        mine = self.scratch_bool[:n]
+        np.equal(self.owner[:n], owner, out=mine)
+        mine &= self.active[:n]
+        return int(np.count_nonzero(mine))
+
+    def compact(self):
+        # Убираем погасшие пули, сохраняя порядок выстрелов
+        n = self.count
+        keep = self.active[:n]
+        alive = int(np.count_nonzero(keep))
+        if alive == n:
+            return
+        # Новое место каждой живой пули - число живых до нее включительно минус один;
+        # погасшие пишутся в последний слот, он заведомо за пределами живых
+        target = self.scratch_index[:n]
+        np.copyto(target, keep)
+        np.add.accumulate(target, out=target)
+        target -= 1
+        dead = self.scratch_bool[:n]
+        np.logical_not(keep, out=dead)
+        np.copyto(target, self.capacity - 1, where=dead)
+        front = self.arrays()
+        for array, back in zip(front, self.back):
+            np.put(back, target, array[:n], mode='clip')
+        self.x, self.y, self.direction, self.owner, self.serial, self.is_player, self.active = self.back
+        self.back = front
+        self.count = alive
+
+    def update(self, max_x, max_y):
+        n = self.count
+        if n == 0:
+            return
+        if n < BULLET_BATCH_THRESHOLD:
+            self.update_small(max_x, max_y)
+            return
+        x = self.x[:n]
+        y = self.y[:n]
+        direction = self.direction[:n]
+        step = self.scratch_int[:n]
+        np.take(BULLET_DX, direction, out=step, mode='clip')
+        x += step
+        np.take(BULLET_DY, direction, out=step, mode='clip')
+        y += step
+
+        # Деактивация при выходе за границы
+        active = self.active[:n]
+        inside = self.scratch_bool[:n]
+        np.greater_equal(x, 0, out=inside)
+        active &= inside
+        np.less_equal(x, max_x, out=inside)
+        active &= inside
+        np.greater_equal(y, 0, out=inside)
+        active &= inside
+        np.less_equal(y, max_y, out=inside)
+        active &= inside
+
+    def update_small(self, max_x, max_y):
+        n = self.count
+        xs = self.x[:n].tolist()
+        ys = self.y[:n].tolist()
+        active = self.active[:n].tolist()
+        for i, direction in enumerate(self.direction[:n].tolist()):
+            x = xs[i] + BULLET_STEPS[direction][0]
+            y = ys[i] + BULLET_STEPS[direction][1]
+            xs[i] = x
+            ys[i] = y
+            if x < 0 or x > max_x or y < 0 or y > max_y:
+                active[i] = False
+        self.x[:n] = xs
+        self.y[:n] = ys
+        self.active[:n] = active
+
+    def select(self, mask):
+        # Номера пуль из mask по возрастанию - тем же раскладом через np.put,
+        # что и при сжатии; результат - срез рабочего буфера до следующего вызова
+        n = len(mask)
+        if n == 0:
+            return self.scratch_selected[:0]
+        target = self.scratch_index[:n]
+        np.copyto(target, mask)
+        np.add.accumulate(target, out=target)
+        count = int(target[-1])
+        target -= 1
+        dead = self.scratch_bool[:n]
+        np.logical_not(mask, out=dead)
+        np.copyto(target, self.capacity - 1, where=dead)
+        np.put(self.scratch_selected, target, self.positions[:n], mode='clip')
+        return self.scratch_selected[:count]
+
+    def hit_tank(self, mask, tank_x, tank_y):
+        # Маска пуль из mask, задевающих танк в (tank_x, tank_y)
+        n = self.count
+        hits = self.scratch_masks[1][:n]
+        test = self.scratch_masks[2][:n]
+        x = self.x[:n]
+        y = self.y[:n]
+        np.less(x, tank_x + TANK_SIZE, out=hits)
+        hits &= mask
+        np.greater(x, tank_x - BULLET_SIZE, out=test)
+        hits &= test
+        np.less(y, tank_y + TANK_SIZE, out=test)
+        hits &= test
+        np.greater(y, tank_y - BULLET_SIZE, out=test)
+        hits &= test
+        return hits
+
+    def touching_walls(self, grid):
+        # Маска пуль, у которых хотя бы один угол в клетке, останавливающей пули
+        n = self.count
+        tiles = np.frombuffer(grid.tiles, dtype=np.uint8)
+        # [ось x, y][ближний, дальний угол][пуля]
+        axes = self.scratch_axes[:4 * n].reshape(2, 2, n)
+        np.add(self.x[:n], BULLET_CORNERS, out=axes[0])
+        np.add(self.y[:n], BULLET_CORNERS, out=axes[1])
+        np.floor_divide(axes, TILE_SIZE, out=axes)
+        # Активные пули не левее и не выше края поля, обрезать нужно только справа
+        # и снизу; погасшие за краем np.take обрезает сам, их маска потом отбросит
+        np.minimum(axes[0], grid.cols - 1, out=axes[0])
+        np.minimum(axes[1], grid.rows - 1, out=axes[1])
+        axes[1] *= grid.cols
+        # [ряд угла][столбец угла][пуля]
+        cells = self.scratch_cells[:4 * n].reshape(2, 2, n)
+        for row in range(2):
+            for col in range(2):
+                np.add(axes[1][row], axes[0][col], out=cells[row, col])
+        index = self.scratch_corner_index[:4 * n]
+        tile = self.scratch_tiles[:4 * n]
+        corner = self.scratch_corners[:4 * n]
+        np.copyto(index, self.scratch_cells[:4 * n])
+        np.take(tiles, index, out=tile, mode='clip')
+        np.copyto(index, tile)
+        np.take(BULLET_BLOCKING_TABLE, index, out=corner, mode='clip')
+        blocked = self.scratch_masks[1][:n]
+        np.logical_or.reduce(corner.reshape(4, n), axis=0, out=blocked)
+        return blocked
+
+    def visible(self, left=0, top=0, width=None, height=None, alpha=1.0):
+        # Координаты активных пуль для отрисовки относительно (left, top);
+        # с размерами области - только пули, попадающие в нее. alpha < 1 -
+        # положение между прошлым и текущим тиком: за тик каждая живая пуля
+        # проходит ровно один шаг, так что прошлое положение не хранится
+        n = self.count
+        x = self.x[:n]
+        y = self.y[:n]
+        lag = int(round((1.0 - alpha) * BULLET_SPEED))
+        if lag:
+            direction = self.direction[:n]
+            x = x - BULLET_DX[direction] * lag // BULLET_SPEED
+            y = y - BULLET_DY[direction] * lag // BULLET_SPEED
+        keep = self.active[:n]
+        if width is not None:
+            keep = (keep & (x > left - BULLET_SIZE) & (x < left + width) &
+                    (y > top - BULLET_SIZE) & (y < top + height))
+        return zip((x[keep] - left).tolist(), (y[keep] - top).tolist(), self.is_player[:n][keep].tolist())
+
+# Запас широкой фазы: насколько танк может сместиться за тик после
+# построения индекса (ход дальнего врага плюс выравнивание при повороте)
+SWEEP_MARGIN = TILE_SIZE
+
+class SweepIndex:
+    # Широкая фаза столкновений танков: танки, отсортированные по x. Индекс
+    # строится раз в тик (почти отсортированный список сортируется за
+    # линейное время), кандидаты ищутся двоичным поиском по окну x с запасом
+    # на движение, а точная проверка идет по текущим координатам.
+    def __init__(self):
+        self.tanks = []
+        self.xs = []
+
+    def rebuild(self, tanks):
+        self.tanks = sorted(tanks, key=tank_x)
+        self.xs = [tank.x for tank in self.tanks]
+
+    def query(self, left, right):
+        # Танки, у которых x при построении был в [left, right]
+        return self.tanks[bisect_left(self.xs, left):bisect_right(self.xs, right)]
+
+def tank_x(tank):
+    return tank.x
+
+def random_enemy_policy(world, enemy, collided):
+    # Исходное поведение врагов: поворот после столкновения или с
+    # вероятностью 1%, выстрел с вероятностью 1%
+    rng = world.rng
+    direction = enemy.direction
+    if collided:
+        direction = rng.randint(0, 3)
+    elif world.chance(0.01):
+        direction = rng.randint(0, 3)
+    return direction, world.chance(0.01)
+
+class World:
+    def __init__(self, cols=GAME_WIDTH // TILE_SIZE, rows=GAME_HEIGHT // TILE_SIZE,
+                 enemy_policy=random_enemy_policy, bullet_limit=None, bullet_capacity=BULLET_CAPACITY):
+        self.grid = TileGrid(cols, rows)
+        # Поведение врагов: fn(world, enemy, collided) -> (direction, fire)
+        self.enemy_policy = enemy_policy
+        self.width = cols * TILE_SIZE
+        self.height = rows * TILE_SIZE
+
+        # У каждого мира свой генератор случайных чисел
+        self.rng = random.Random()
+        self.seed = None
+        self.level = None
+
+        self.tick = 0
+        self.score = 0
+        self.player_lives = PLAYER_LIVES
+        self.game_over = False
+        self.game_won = False
+        # Число вызовов step за жизнь объекта; в отличие от tick не
+        # откатывается снимком и не сбрасывается с уровнем
+        self.steps = 0
+
+        self.player = None
+        # Все танки игроков; в одиночной игре - только self.player
+        self.players = []
+        self.enemies = []
+        # Широкая фаза для столкновений танков с танками и пулями
+        self.tank_index = SweepIndex()
+        self.bullets = BulletStore(bullet_capacity)
+        # Сколько пуль одного танка может быть в полете; None - без ограничения
+        self.bullet_limit = bullet_limit
+
+        # Предыдущая маска ввода: нужна, чтобы отличить нажатие от удержания
+        self.prev_actions = 0
+
+        # Необязательный профилировщик фаз тика (profiler.FrameProfiler)
+        self.profiler = None
+        # Общее поле расстояний до игрока для политики преследования
+        # (flowfield.FlowField), создается при первом обращении
+        self.flow_field = None
+        # Маски стен по рядам и колонкам для прицельной стрельбы (sightlines.SightLines)
+        self.sight_lines = None
+        # Сколько тиков покрывает текущий вызов политики врага: дальние враги
+        # обновляются раз в FAR_ENEMY_PERIOD тиков
+        self.enemy_steps = 1
+
+    def reset(self, seed=None, level=None):
+        # Seed известен всегда, чтобы любую партию можно было воспроизвести
+        if seed is None:
+            seed = random.SystemRandom().randrange(2 ** 63)
+        self.seed = seed
+        self.rng.seed(seed)
+
+        self.tick = 0
+        self.score = 0
+        self.player_lives = PLAYER_LIVES
+        self.game_over = False
+        self.game_won = False
+        self.prev_actions = 0
+
+        self.bullets.clear()
+        # Без уровня строится встроенная классическая карта
+        self.level = level
+        if level is None:
+            self.build_classic_level()
+        else:
+            self.load_level(level)
+        self.number_tanks()
+
+    def number_tanks(self):
+        # Игрок - 0, враги - по порядку с 1; номер задает и порядок врагов
+        # при разборе попаданий
+        self.players = [self.player]
+        self.player.id = 0
+        for i, enemy in enumerate(self.enemies, 1):
+            enemy.id = i
+        self.tank_index.rebuild(self.players + self.enemies)
+
+    def load_level(self, level):
+        grid = self.grid
+        if (grid.cols, grid.rows) != (level.cols, level.rows):
+            grid.resize(level.cols, level.rows)
+            self.width = level.cols * TILE_SIZE
+            self.height = level.rows * TILE_SIZE
+        grid.load(level.tiles)
+
+        col, row = level.player_spawn
+        self.player = Tank(col * TILE_SIZE, row * TILE_SIZE, True)
+        self.enemies = [Tank(col * TILE_SIZE, row * TILE_SIZE) for col, row in level.enemy_spawns]
+
+    def build_classic_level(self):
+        grid = self.grid
+        grid.reset()
+
+        # Стальная рамка по краю поля
+        for col in range(grid.cols):
+            grid.set(col, 0, STEEL)
+            grid.set(col, grid.rows - 1, STEEL)
+        for row in range(1, grid.rows - 1):
+            grid.set(0, row, STEEL)
+            grid.set(grid.cols - 1, row, STEEL)
+
+        for col, row, wall_type in CLASSIC_LEVEL:
+            grid.set(col, row, TILE_TYPES[wall_type])
+
+        self.player = Tank(CLASSIC_PLAYER[0] * TILE_SIZE, CLASSIC_PLAYER[1] * TILE_SIZE, True)
+        self.enemies = [Tank(col * TILE_SIZE, row * TILE_SIZE) for col, row in CLASSIC_ENEMIES]
+
+    def checksum(self):
+        # Контрольная сумма состояния для сверки повторных прогонов
+        tanks = self.players + self.enemies
+        crc = zlib.crc32(struct.pack('<iiiBB', self.tick, self.score, self.player_lives,
+                                     self.game_over, self.game_won))
+        crc = zlib.crc32(self.grid.tiles, crc)
+        for tank in tanks:
+            crc = zlib.crc32(struct.pack('<iib', tank.x, tank.y, tank.direction), crc)
+        bullets = self.bullets
+        n = bullets.count
+        # Направления хранятся как intp (индексы для np.take), в сумму идут байтами
+        for array in (bullets.x, bullets.y, bullets.direction[:n].astype(np.int8), bullets.is_player, bullets.active):
+            crc = zlib.crc32(array[:n].tobytes(), crc)
+        return crc
+
+    def chance(self, probability):
+        # Событие с вероятностью probability за тик, пересчитанной на все
+        # тики текущего хода врага: дальние враги стреляют и поворачивают
+        # так же часто, как ближние
+        steps = self.enemy_steps
+        if steps != 1:
+            probability = 1.0 - (1.0 - probability) ** steps
+        return self.rng.random() < probability
+
+    @property
+    def done(self):
+        return self.game_over or self.game_won
+
+    def check_tank_wall_collision(self, tank):
+        return self.grid.find_blocking(tank.x, tank.y, tank.width, tank.height, TANK_BLOCKING) is not None
+
+    def check_tank_tank_collision(self, tank):
+        # Столкновение с любым другим танком, кандидаты - из широкой фазы;
+        # проверка пересечения развернута, это самый горячий цикл тика
+        x, y, width, height = tank.x, tank.y, tank.width, tank.height
+        for other in self.tank_index.query(x - TANK_SIZE - SWEEP_MARGIN, x + width + SWEEP_MARGIN):
+            if (y < other.y + other.height and other.y < y + height and
+                    x < other.x + other.width and other.x < x + width and other is not tank):
+                return True
+        return False
+
+    def bullet_target(self, x, y, killed):
+        # Враг, в которого попала пуля игрока; при нескольких - первый по порядку
+        target = None
+        for tank in self.tank_index.query(x - TANK_SIZE - SWEEP_MARGIN, x + BULLET_SIZE + SWEEP_MARGIN):
+            if (not tank.is_player and tank not in killed and (target is None or tank.id < target.id) and
+                    rects_overlap(x, y, BULLET_SIZE, BULLET_SIZE, tank.x, tank.y, tank.width, tank.height)):
+                target = tank
+        return target
+
+    def kill_enemies(self, killed):
+        self.enemies = [enemy for enemy in self.enemies if enemy not in killed]
+        self.score += ENEMY_SCORE * len(killed)
+        if len(self.enemies) == 0:
+            self.game_won = True
+
+    def shoot_bullet(self, shooter, is_player):
+        # False, если у танка уже максимум пуль в полете или пул заполнен
+        if self.bullet_limit is not None and self.bullets.owned_by(shooter.id) >= self.bullet_limit:
+            return False
+        if shooter.direction == 0:  # вверх
+            bullet_x = shooter.x + shooter.width // 2 - 3
+            bullet_y = shooter.y - 6
+        elif shooter.direction == 1:  # вправо
+            bullet_x = shooter.x + shooter.width
+            bullet_y = shooter.y + shooter.height // 2 - 3
+        elif shooter.direction == 2:  # вниз
+            bullet_x = shooter.x + shooter.width // 2 - 3
+            bullet_y = shooter.y + shooter.height
+        else:  # влево
+            bullet_x = shooter.x - 6
+            bullet_y = shooter.y + shooter.height // 2 - 3
+
+        return self.bullets.spawn(bullet_x, bullet_y, shooter.direction, is_player, shooter.id)
+
+    def apply_actions(self, actions):
+        # Новое нажатие направления поворачивает танк, удержание - только двигает
+        pressed = actions & ~self.prev_actions
+        self.prev_actions = actions
+        self.press(self.player, pressed)
+
+    def press(self, tank, pressed):
+        if pressed & ACTION_MOVE:
+            for direction in (0, 3, 2, 1):  # приоритет как у клавиш W, A, S, D
+                if pressed & (1 << direction):
+                    tank.direction = direction
+                    break
+
+        if pressed & ACTION_FIRE:
+            self.shoot_bullet(tank, True)
+
+    def move_player(self, tank):
+        old_x, old_y = tank.move(self.width, self.height)
+
+        if (self.check_tank_wall_collision(tank) or
+            self.check_tank_tank_collision(tank)):
+            tank.x, tank.y = old_x, old_y
+
+    def step(self, actions=0):
+        self.steps += 1
+        if self.game_over or self.game_won:
+            self.prev_actions = actions
+            return True
+
+        # Положения на начало тика - для плавной отрисовки между тиками
+        for tank in self.players + self.enemies:
+            tank.prev_x = tank.x
+            tank.prev_y = tank.y
+
+        self.update_players(actions)
+
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.lap('player')
+
+        # Обновление врагов
+        self.update_enemies()
+        if profiler is not None:
+            profiler.lap('enemies')
+
+        # Обновление пуль
+        self.bullets.update(self.width, self.height)
+        if profiler is not None:
+            profiler.lap('bullets')
+
+        # Проверка столкновений
+        self.check_collisions()
+        if profiler is not None:
+            profiler.lap('collisions')
+
+        self.tick += 1
+        return self.game_over or self.game_won
+
+    def update_players(self, actions):
+        self.apply_actions(actions)
+        self.tank_index.rebuild(self.players + self.enemies)
+
+        # Движение игрока
+        if actions & ACTION_MOVE:
+            self.move_player(self.player)
+
+    def update_enemies(self):
+        policy = self.enemy_policy
+        # Враги дальше экрана от всех игроков обновляются раз в FAR_ENEMY_PERIOD
+        # тиков со сдвигом по номеру танка и проходят сразу весь накопленный
+        # путь. Номер не меняется, когда погибают другие враги, поэтому каждый
+        # дальний враг ходит ровно через FAR_ENEMY_PERIOD тиков. На
+        # классической карте таких врагов не бывает.
+        centers = [(player.x + player.width // 2, player.y + player.height // 2) for player in self.players]
+        tick = self.tick
+        for enemy in self.enemies:
+            steps = 1
+            for center_x, center_y in centers:
+                if abs(enemy.x - center_x) <= FAR_ENEMY_DISTANCE_X and abs(enemy.y - center_y) <= FAR_ENEMY_DISTANCE_Y:
+                    break
+            else:
+                if (tick + enemy.id) % FAR_ENEMY_PERIOD:
+                    continue
+                steps = FAR_ENEMY_PERIOD
+            self.enemy_steps = steps
+            old_x, old_y = enemy.move(self.width, self.height, steps)
+
+            collided = (self.check_tank_wall_collision(enemy) or
+                       self.check_tank_tank_collision(enemy))
+
+            if collided:
+                enemy.x, enemy.y = old_x, old_y
+
+            enemy.direction, fire = policy(self, enemy, collided)
+            if fire:
+                self.shoot_bullet(enemy, False)
+
+    def check_collisions(self):
+        bullets = self.bullets
+        bullets.compact()
+        n = bullets.count
+        if n == 0:
+            return
+        if n < BULLET_BATCH_THRESHOLD:
+            self.check_collisions_small()
+            return
+        active = bullets.active[:n]
+        is_player = bullets.is_player[:n]
+        mask = bullets.scratch_masks[0][:n]
+
+        # Пули игрока с врагами: кандидаты из широкой фазы, по порядку выстрелов
+        if self.enemies:
+            killed = set()
+            np.logical_and(active, is_player, out=mask)
+            for i in bullets.select(mask).tolist():
+                target = self.bullet_target(int(bullets.x[i]), int(bullets.y[i]), killed)
+                if target is not None:
+                    killed.add(target)
+                    active[i] = False
+            if killed:
+                self.kill_enemies(killed)
+
+        # Пули врагов с игроками
+        for player in self.players:
+            np.logical_not(is_player, out=mask)
+            mask &= active
+            hits = bullets.hit_tank(mask, player.x, player.y)
+            count = int(np.count_nonzero(hits))
+            if count:
+                np.logical_not(hits, out=hits)
+                active &= hits
+                self.player_lives -= count
+                if self.player_lives <= 0:
+                    self.game_over = True
+
+        # Пули со стенами: пули игрока проверяются раньше пуль врагов. Маска
+        # стен считается один раз: клетки за тик только расчищаются, и лишний
+        # кандидат отсеется точной проверкой ниже
+        grid = self.grid
+        blocked = bullets.touching_walls(grid)
+        for owner in (True, False):
+            np.equal(is_player, owner, out=mask)
+            mask &= active
+            mask &= blocked
+            for i in bullets.select(mask).tolist():
+                # Кирпич мог быть разрушен предыдущей пулей этого же тика
+                cell = grid.find_blocking(int(bullets.x[i]), int(bullets.y[i]), BULLET_SIZE, BULLET_SIZE, BULLET_BLOCKING)
+                if cell is not None:
+                    active[i] = False
+                    if grid.get(*cell) == BRICK:
+                        grid.clear(*cell)
+
+    def check_collisions_small(self):
+        # Тот же порядок проверок, что и в пакетной версии, но поштучно
+        bullets = self.bullets
+        n = bullets.count
+        xs = bullets.x[:n].tolist()
+        ys = bullets.y[:n].tolist()
+        is_player = bullets.is_player[:n].tolist()
+        active = bullets.active[:n].tolist()
+
+        # Пули игрока с врагами
+        if self.enemies:
+            killed = set()
+            for i in range(n):
+                if active[i] and is_player[i]:
+                    target = self.bullet_target(xs[i], ys[i], killed)
+                    if target is not None:
+                        killed.add(target)
+                        active[i] = False
+            if killed:
+                self.kill_enemies(killed)
+
+        # Пули врагов с игроками
+        for i in range(n):
+            if active[i] and not is_player[i]:
+                for player in self.players:
+                    if rects_overlap(xs[i], ys[i], BULLET_SIZE, BULLET_SIZE, player.x, player.y, player.width, player.height):
+                        active[i] = False
+                        self.player_lives -= 1
+                        if self.player_lives <= 0:
+                            self.game_over = True
+                        break
+
+        # Пули со стенами: пули игрока проверяются раньше пуль врагов
+        grid = self.grid
+        for owner in (True, False):
+            for i in range(n):
+                if active[i] and is_player[i] == owner:
+                    cell = grid.find_blocking(xs[i], ys[i], BULLET_SIZE, BULLET_SIZE, BULLET_BLOCKING)
+                    if cell is not None:
+                        active[i] = False
+                        if grid.get(*cell) == BRICK:
+                            grid.clear(*cell)
+
+        bullets.active[:n] = active
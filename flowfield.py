@@ -0,0 +1,190 @@
+import heapq
+
+import numpy as np
+
+from core import TILE_SIZE, BRICK, STEEL, WATER
+
+# Поле расстояний до цели по сетке клеток, общее для всех врагов.
+# Узел (col, row) - положение танка, выровненного по клеткам: танк в 1.5
+# клетки занимает квадрат 2x2 клетки с левым верхним углом в узле. Узел
+# непроходим, если в квадрате есть сталь, вода или край карты; кирпич
+# проходим, но дороже - его нужно сначала прострелить.
+#
+# Поле считается алгоритмом Дейкстры от цели один раз на положение цели.
+# Разрушение кирпича только удешевляет узлы, поэтому поле обновляется
+# частично: от подешевевших узлов заново распространяются уменьшения.
+#
+# Вся работа поиска делится на порции по SEARCH_BUDGET узлов за тик:
+# сначала распространяются уменьшения от разрушенного кирпича, затем
+# идет поиск для новой цели, а враги тем временем идут по прежнему полю;
+# готовое поле подменяет старое целиком. Поэтому время тика не зависит от
+# размера карты, а на больших картах враги идут к месту, где игрок был
+# доли секунды назад. Враг на каждом тике только смотрит на соседние
+# узлы - O(1) на танк.
+#
+# Незаконченный поиск и кучи - часть состояния мира: от них зависит, куда
+# поедут враги. Поэтому поле целиком входит в снимок (snapshot.py).
+
+STEP_COST = 1
+BRICK_COST = 4
+UNREACHABLE = float('inf')
+# Узлов, извлекаемых из кучи поиска за один тик (около 2 мс)
+SEARCH_BUDGET = 800
+
+# Соседи по направлениям 0: вверх, 1: вправо, 2: вниз, 3: влево
+NEIGHBOURS = ((0, -1), (1, 0), (0, 1), (-1, 0))
+
+class FlowField:
+    def __init__(self, grid):
+        self.grid = grid
+        self.generation = None
+        self.goal = None
+        self.cols = 0
+        self.rows = 0
+        self.cost = []
+        self.distance = []
+        # Уменьшения текущего поля, еще не распространенные от разрушенного кирпича
+        self.repair_heap = []
+        # Незаконченный поиск для новой цели: цель, расстояния и куча
+        self.search_goal = None
+        self.search_distance = None
+        self.search_heap = []
+        # Номер шага мира (World.steps) последнего обновления: поле обновляется
+        # раз за шаг, а не на каждого врага. Номер тика для этого не годится:
+        # после отката к уже пройденному тику поле обновилось бы не так, как
+        # в первый раз
+        self.step = None
+        grid.listeners.append(self.on_tile_cleared)
+
+    def node_cost(self, col, row):
+        # Стоимость входа в узел; None - узел непроходим
+        grid = self.grid
+        if col < 0 or row < 0 or col + 1 >= grid.cols or row + 1 >= grid.rows:
+            return None
+        cost = STEP_COST
+        for c, r in ((col, row), (col + 1, row), (col, row + 1), (col + 1, row + 1)):
+            tile = grid.get(c, r)
+            if tile == STEEL or tile == WATER:
+                return None
+            if tile == BRICK:
+                cost = STEP_COST + BRICK_COST
+        return cost
+
+    def rebuild(self):
+        grid = self.grid
+        self.generation = grid.generation
+        self.cols = grid.cols
+        self.rows = grid.rows
+        # Те же правила, что в node_cost, но для всей карты сразу: узел покрывает
+        # клетки [row, row + 1] x [col, col + 1], последние ряд и колонка - край карты
+        tiles = np.frombuffer(grid.tiles, dtype=np.uint8).reshape(grid.rows, grid.cols)
+        blocked = np.ones((grid.rows, grid.cols), dtype=bool)
+        brick = np.zeros((grid.rows, grid.cols), dtype=bool)
+        for kind, out in (((tiles == STEEL) | (tiles == WATER), blocked), (tiles == BRICK, brick)):
+            out[:-1, :-1] = kind[:-1, :-1] | kind[1:, :-1] | kind[:-1, 1:] | kind[1:, 1:]
+        cost = np.where(brick, STEP_COST + BRICK_COST, STEP_COST)
+        self.cost = [None if node_blocked else node_cost
+                     for node_blocked, node_cost in zip(blocked.ravel().tolist(), cost.ravel().tolist())]
+        # До конца первого поиска путей нет, и враги ведут себя как случайные
+        self.goal = None
+        self.distance = [UNREACHABLE] * (self.cols * self.rows)
+        self.repair_heap = []
+        self.search_goal = None
+        self.search_distance = None
+        self.search_heap = []
+
+    def update_goal(self, tank, step):
+        # Стоимости пересчитываются при смене карты, новый поиск начинается при
+        # переходе цели в другой узел, если предыдущий уже закончен
+        if self.generation != self.grid.generation:
+            self.rebuild()
+        elif step == self.step:
+            return
+        self.step = step
+        budget = SEARCH_BUDGET
+        if self.repair_heap:
+            budget -= self.propagate(self.distance, self.repair_heap, budget)
+        goal = ((tank.x + TILE_SIZE // 2) // TILE_SIZE, (tank.y + TILE_SIZE // 2) // TILE_SIZE)
+        if self.search_goal is None and goal != self.goal:
+            self.search_goal = goal
+            self.search_distance = [UNREACHABLE] * (self.cols * self.rows)
+            index = goal[1] * self.cols + goal[0]
+            self.search_distance[index] = 0
+            self.search_heap = [(0, index)]
+        if self.search_goal is not None and budget > 0:
+            self.propagate(self.search_distance, self.search_heap, budget)
+            if not self.search_heap:
+                # Новое поле уже учло весь разрушенный за время поиска кирпич
+                self.goal = self.search_goal
+                self.distance = self.search_distance
+                self.repair_heap = []
+                self.search_goal = None
+                self.search_distance = None
+
+    def propagate(self, distance, heap, budget):
+        # Дейкстра в обратную сторону: из узла m в соседа n за стоимость входа в m.
+        # heap - куча (расстояние, узел); извлекается не больше budget узлов,
+        # остаток работы остается в куче. Возвращает число извлеченных узлов
+        cols = self.cols
+        rows = self.rows
+        cost = self.cost
+        pops = 0
+        while heap and pops < budget:
+            pops += 1
+            d, index = heapq.heappop(heap)
+            if d > distance[index]:
+                continue
+            col, row = index % cols, index // cols
+            step = cost[index]
+            if step is None:
+                # Цель может стоять у воды или стали; из нее можно выйти за шаг
+                step = STEP_COST
+            d += step
+            for dc, dr in NEIGHBOURS:
+                c, r = col + dc, row + dr
+                if 0 <= c < cols and 0 <= r < rows:
+                    n = r * cols + c
+                    if cost[n] is not None and d < distance[n]:
+                        distance[n] = d
+                        heapq.heappush(heap, (d, n))
+        return pops
+
+    def on_tile_cleared(self, col, row, old_tile):
+        if old_tile != BRICK or self.generation != self.grid.generation:
+            return
+        # Кирпич входит в квадраты четырех узлов; уменьшения распространятся
+        # в следующих тиках в пределах бюджета
+        search = self.search_distance
+        for c, r in ((col - 1, row - 1), (col, row - 1), (col - 1, row), (col, row)):
+            if 0 <= c < self.cols and 0 <= r < self.rows:
+                index = r * self.cols + c
+                cost = self.node_cost(c, r)
+                if cost != self.cost[index]:
+                    self.cost[index] = cost
+                    if self.distance[index] < UNREACHABLE:
+                        heapq.heappush(self.repair_heap, (self.distance[index], index))
+                    # Незаконченный поиск заберет уменьшение вместе с остальной работой
+                    if search is not None and search[index] < UNREACHABLE:
+                        heapq.heappush(self.search_heap, (search[index], index))
+
+    def get(self, col, row):
+        if 0 <= col < self.cols and 0 <= row < self.rows:
+            return self.distance[row * self.cols + col]
+        return UNREACHABLE
+
+    def best_direction(self, col, row):
+        # Направление к соседу, ближайшему к цели; None - стоим в цели или пути нет
+        best = self.get(col, row)
+        direction = None
+        for d, (dc, dr) in enumerate(NEIGHBOURS):
+            distance = self.get(col + dc, row + dr)
+            if distance < best:
+                best = distance
+                direction = d
+        return direction
+
+    def is_brick(self, col, row):
+        if 0 <= col < self.cols and 0 <= row < self.rows:
+            cost = self.cost[row * self.cols + col]
+            return cost is not None and cost > STEP_COST
+        return False
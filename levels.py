@@ -0,0 +1,144 @@
+import json
+import mmap
+import os
+import struct
+
+from core import EMPTY, BRICK, STEEL, FOREST, WATER
+
+# Уровни хранятся в текстовых файлах: одна строка - один ряд клеток.
+#   .  пусто         B  кирпич     S  сталь
+#   F  лес           W  вода
+#   P  игрок         E  враг       (левый верхний угол танка, клетка пустая)
+#
+# При первой загрузке текст компилируется в компактный бинарный файл в
+# папке .cache рядом с уровнем: заголовок, точки появления танков и массив
+# типов клеток по байту на клетку. Следующие загрузки отображают кэш в
+# память через mmap и копируют клетки одним срезом. Кэш пересобирается,
+# если размер или время изменения исходника не совпадают с записанными.
+
+LEVEL_MAGIC = b'BCLV'
+LEVEL_VERSION = 1
+# magic, версия, колонки, ряды, размер и mtime исходника, игрок (col, row), число врагов
+LEVEL_HEADER = struct.Struct('<4sBHHQqHHH')
+SPAWN = struct.Struct('<HH')
+
+TILE_CHARS = {'.': EMPTY, 'B': BRICK, 'S': STEEL, 'F': FOREST, 'W': WATER, 'P': EMPTY, 'E': EMPTY}
+
+class LevelError(Exception):
+    pass
+
+class Level:
+    def __init__(self, name, cols, rows, tiles, player_spawn, enemy_spawns):
+        self.name = name
+        self.cols = cols
+        self.rows = rows
+        self.tiles = tiles
+        self.player_spawn = player_spawn
+        self.enemy_spawns = enemy_spawns
+
+def parse_level(text, name='<level>'):
+    lines = [line.rstrip() for line in text.splitlines()]
+    lines = [line for line in lines if line and not line.startswith('#')]
+    if not lines:
+        raise LevelError(f'{name}: пустой уровень')
+    cols = len(lines[0])
+    rows = len(lines)
+
+    tiles = bytearray(cols * rows)
+    player_spawn = None
+    enemy_spawns = []
+    for row, line in enumerate(lines):
+        if len(line) != cols:
+            raise LevelError(f'{name}: ряд {row + 1} длиной {len(line)}, ожидалось {cols}')
+        for col, char in enumerate(line):
+            tile = TILE_CHARS.get(char)
+            if tile is None:
+                raise LevelError(f'{name}: неизвестный символ {char!r} в ряду {row + 1}, колонке {col + 1}')
+            tiles[row * cols + col] = tile
+            if char == 'P':
+                if player_spawn is not None:
+                    raise LevelError(f'{name}: больше одной точки появления игрока')
+                player_spawn = (col, row)
+            elif char == 'E':
+                enemy_spawns.append((col, row))
+
+    if player_spawn is None:
+        raise LevelError(f'{name}: нет точки появления игрока (P)')
+    return Level(name, cols, rows, bytes(tiles), player_spawn, enemy_spawns)
+
+def cache_path(source):
+    directory, filename = os.path.split(source)
+    return os.path.join(directory, '.cache', os.path.splitext(filename)[0] + '.lvl')
+
+def compile_level(source):
+    with open(source, encoding='utf-8') as f:
+        level = parse_level(f.read(), source)
+    stat = os.stat(source)
+
+    header = LEVEL_HEADER.pack(LEVEL_MAGIC, LEVEL_VERSION, level.cols, level.rows, stat.st_size,
+                               stat.st_mtime_ns, level.player_spawn[0], level.player_spawn[1],
+                               len(level.enemy_spawns))
+    spawns = b''.join(SPAWN.pack(col, row) for col, row in level.enemy_spawns)
+
+    path = cache_path(source)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Запись через временный файл, чтобы параллельные процессы не прочли половину
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(header + spawns + level.tiles)
+    os.replace(temp_path, path)
+    return level
+
+def read_compiled(source, path):
+    # None, если кэша нет или он устарел
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    with f:
+        if os.fstat(f.fileno()).st_size < LEVEL_HEADER.size:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            (magic, version, cols, rows, size, mtime_ns,
+             player_col, player_row, enemy_count) = LEVEL_HEADER.unpack_from(data)
+            if magic != LEVEL_MAGIC or version != LEVEL_VERSION:
+                return None
+            stat = os.stat(source)
+            if size != stat.st_size or mtime_ns != stat.st_mtime_ns:
+                return None
+
+            offset = LEVEL_HEADER.size
+            enemy_spawns = [SPAWN.unpack_from(data, offset + i * SPAWN.size) for i in range(enemy_count)]
+            offset += enemy_count * SPAWN.size
+            tiles = data[offset:offset + cols * rows]
+            if len(tiles) != cols * rows:
+                return None
+    return Level(source, cols, rows, tiles, (player_col, player_row), enemy_spawns)
+
+def load_level(source):
+    level = read_compiled(source, cache_path(source))
+    if level is None:
+        level = compile_level(source)
+    return level
+
+class LevelPack:
+    # Индекс набора уровней; сами уровни загружаются при первом обращении
+    def __init__(self, path):
+        self.path = path
+        with open(path, encoding='utf-8') as f:
+            index = json.load(f)
+        directory = os.path.dirname(path)
+        self.name = index.get('name', os.path.basename(directory))
+        self.sources = [os.path.join(directory, stage) for stage in index['stages']]
+        if not self.sources:
+            raise LevelError(f'{path}: в наборе нет уровней')
+        self.loaded = {}
+
+    def __len__(self):
+        return len(self.sources)
+
+    def stage(self, index):
+        level = self.loaded.get(index)
+        if level is None:
+            level = self.loaded[index] = load_level(self.sources[index])
+        return level
@@ -1,17 +1,32 @@
-import pygame
-import random
-import sys
+import argparse
+import json
 import os
+import time
+from collections import OrderedDict
+
+# Отсчет холодного старта: от начала импорта модуля до первого кадра
+STARTUP_TIME = time.perf_counter()
+
+# Без приветствия pygame в консоли при каждом запуске
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+import pygame
+
+from capture import FrameCapture
+from core import (
+    TILE_SIZE, GAME_WIDTH, GAME_HEIGHT, TANK_SIZE, BULLET_SIZE,
+    EMPTY, BRICK, STEEL, FOREST, WATER, TILE_NAMES, ACTION_UP, ACTION_RIGHT, ACTION_DOWN, ACTION_LEFT, ACTION_FIRE,
+    World,
+)
+from levels import LevelPack
+from policies import ENEMY_POLICIES, enemy_policy_name
+from profiler import FrameProfiler
+from replay import Replay, ReplayPlayer
+import snapshot
 
-# Инициализация Pygame
-pygame.init()
-pygame.font.init()
-pygame.mixer.init()
+# Подсистемы pygame запускаются по мере надобности: окно - в Game, шрифты -
+# при первом тексте. Звук игре не нужен и не запускается вовсе.
 
-# Константы игры
-TILE_SIZE = 16
-GAME_WIDTH = 416
-GAME_HEIGHT = 416
+# Константы экрана
 SCREEN_WIDTH = GAME_WIDTH
 SCREEN_HEIGHT = GAME_HEIGHT + 80  # Добавляем место для интерфейса
 
@@ -26,368 +41,460 @@ GRAY = (85, 85, 85)
 DARK_GREEN = (34, 139, 34)
 BLUE = (30, 144, 255)
 
-class Tank:
-    def __init__(self, x, y, is_player=False):
-        self.x = x
-        self.y = y
-        self.width = TILE_SIZE * 1.5
-        self.height = TILE_SIZE * 1.5
-        self.speed = 2 if is_player else 1
-        self.direction = 0  # 0: вверх, 1: вправо, 2: вниз, 3: влево
-        self.is_player = is_player
-        self.color = GREEN if is_player else RED
-        
-        self.image = pygame.image.load('assets/tank.png')
-        self.has_image = True
-
-
-    def draw(self, screen):
-        if self.has_image and self.image:
-                sprite_width = self.image.get_width() // 4
-                sprite_height = self.image.get_height()
-                
-                # Определяем область спрайта в зависимости от направления
-                if self.direction == 0:  # вверх
-                    sx = sprite_width * 2
-                elif self.direction == 1:  # вправо
-                    sx = sprite_width * 0
-                elif self.direction == 2:  # вниз
-                    sx = sprite_width * 3
-                else:  # влево
-                    sx = sprite_width * 1
-                
-                # Создаем поверхность для спрайта
-                sprite_surface = pygame.Surface((sprite_width, sprite_height), pygame.SRCALPHA)
-                # Исправленный blit - убираем лишние скобки
-                sprite_surface.blit(self.image, (-sx, 0))
-                
-                # Масштабируем и рисуем
-                scaled_sprite = pygame.transform.scale(sprite_surface, (int(self.width), int(self.height)))
-                screen.blit(scaled_sprite, (self.x, self.y))
-                return
-        
-        # Fallback отрисовка - упрощенная версия
-        tank_rect = pygame.Rect(self.x, self.y, self.width, self.height)
-        
-        # Корпус танка
-        pygame.draw.rect(screen, self.color, tank_rect)
-        
-        # Пушка (в зависимости от направления)
-        if self.direction == 0:  # вверх
-            pygame.draw.rect(screen, (51, 51, 51), 
-                           (self.x + self.width // 2 - 2, self.y - 8, 4, 12))
-        elif self.direction == 1:  # вправо
-            pygame.draw.rect(screen, (51, 51, 51), 
-                           (self.x + self.width, self.y + self.height // 2 - 2, 12, 4))
-        elif self.direction == 2:  # вниз
-            pygame.draw.rect(screen, (51, 51, 51), 
-                           (self.x + self.width // 2 - 2, self.y + self.height, 4, 12))
-        else:  # влево
-            pygame.draw.rect(screen, (51, 51, 51), 
-                           (self.x - 12, self.y + self.height // 2 - 2, 12, 4))
-
-    def move(self):
-        old_x, old_y = self.x, self.y
-        
-        if self.direction == 0:  # вверх
-            self.y -= self.speed
-        elif self.direction == 1:  # вправо
-            self.x += self.speed
-        elif self.direction == 2:  # вниз
-            self.y += self.speed
-        elif self.direction == 3:  # влево
-            self.x -= self.speed
-        
-        # Ограничение движения в пределах экрана
-        self.x = max(0, min(GAME_WIDTH - self.width, self.x))
-        self.y = max(0, min(GAME_HEIGHT - self.height, self.y))
-        
-        return old_x, old_y
-
-    def get_rect(self):
-        return pygame.Rect(self.x, self.y, self.width, self.height)
-
-    def collides_with(self, other):
-        return self.get_rect().colliderect(other.get_rect())
-
-class Bullet:
-    def __init__(self, x, y, direction, is_player):
-        self.x = x
-        self.y = y
-        self.width = 6
-        self.height = 6
-        self.speed = 5
-        self.direction = direction
-        self.is_player = is_player
-        self.active = True
+class SpriteAtlas:
+    # Порядок кадров на листе tank.png: вправо, влево, вверх, вниз
+    TANK_SHEET_ORDER = {0: 2, 1: 0, 2: 3, 3: 1}
 
-    def update(self):
-        if self.direction == 0:  # вверх
-            self.y -= self.speed
-        elif self.direction == 1:  # вправо
-            self.x += self.speed
-        elif self.direction == 2:  # вниз
-            self.y += self.speed
-        elif self.direction == 3:  # влево
-            self.x -= self.speed
-        
-        # Деактивация при выходе за границы
-        if (self.x < 0 or self.x > GAME_WIDTH or 
-            self.y < 0 or self.y > GAME_HEIGHT):
-            self.active = False
-
-    def draw(self, screen):
-        color = YELLOW if self.is_player else RED
-        pygame.draw.rect(screen, color, (self.x, self.y, self.width, self.height))
-
-    def get_rect(self):
-        return pygame.Rect(self.x, self.y, self.width, self.height)
-
-    def collides_with(self, other):
-        return self.get_rect().colliderect(other.get_rect())
-
-class Wall:
-    def __init__(self, x, y, wall_type='brick'):
-        self.x = x
-        self.y = y
-        self.width = TILE_SIZE
-        self.height = TILE_SIZE
-        self.type = wall_type
-        
-        # Загрузка изображения стены
-        try:
-            image_path = f'assets/{wall_type}.png'
+    def __init__(self):
+        self.images = {}
+        self.tank_cache = {}
+        self.tile_cache = {}
+
+    def image(self, name):
+        # Каждый файл загружается с диска один раз и приводится к формату экрана
+        if name not in self.images:
+            image = None
+            image_path = f'assets/{name}.png'
             if os.path.exists(image_path):
-                self.image = pygame.image.load(image_path)
-                self.has_image = True
-            else:
-                self.has_image = False
-        except Exception as e:
-            self.has_image = False
+                try:
+                    image = pygame.image.load(image_path)
+                    if pygame.display.get_surface() is not None:
+                        image = image.convert_alpha()
+                except pygame.error as e:
+                    print(f"Ошибка загрузки {image_path}: {e}")
+                    image = None
+            self.images[name] = image
+        return self.images[name]
+
+    def tank_frames(self, width, height):
+        # Четыре кадра по направлениям, уже вырезанные и отмасштабированные
+        size = (int(width), int(height))
+        if size not in self.tank_cache:
+            sheet = self.image('tank')
+            frames = None
+            if sheet is not None:
+                sprite_width = sheet.get_width() // 4
+                sprite_height = sheet.get_height()
+                frames = []
+                for direction in range(4):
+                    sx = sprite_width * self.TANK_SHEET_ORDER[direction]
+                    frame = sheet.subsurface((sx, 0, sprite_width, sprite_height))
+                    frames.append(pygame.transform.scale(frame, size))
+            self.tank_cache[size] = frames
+        return self.tank_cache[size]
+
+    def preload(self):
+        # Все картинки разом при старте, а не по одной при первом появлении в кадре
+        for name in TILE_NAMES.values():
+            self.tile(name)
+        self.tank_frames(TANK_SIZE, TANK_SIZE)
 
-    def draw(self, screen):
-        if self.has_image and self.image:
+    def tile(self, name):
+        # Спрайт стены, приведенный к размеру клетки поля
+        if name not in self.tile_cache:
+            image = self.image(name)
+            if image is not None and image.get_size() != (TILE_SIZE, TILE_SIZE):
+                image = pygame.transform.scale(image, (TILE_SIZE, TILE_SIZE))
+            self.tile_cache[name] = image
+        return self.tile_cache[name]
+
+atlas = SpriteAtlas()
+
+# Пути найденных системных шрифтов сохраняются на диск: поиск SysFont на
+# Linux запускает fc-list, на Windows читает реестр, и это заметная доля
+# времени старта. Удалите файл, если установили новые шрифты.
+FONT_CACHE_PATH = os.path.join('assets', '.cache', 'fonts.json')
+TEXT_CACHE_SIZE = 256
+
+class FontCache:
+    def __init__(self, path=FONT_CACHE_PATH):
+        self.path = path
+        self.paths = None
+        self.fonts = {}
+        self.texts = {}
+
+    def resolve(self, name):
+        # Путь к файлу шрифта; None - встроенный шрифт pygame, как у SysFont
+        if self.paths is None:
             try:
-                screen.blit(self.image, (self.x, self.y))
-                return
-            except Exception as e:
-                print(f"Ошибка отрисовки {self.type}: {e}")
-        
-        # Fallback отрисовка
-        if self.type == 'brick':
-            color = BROWN
-        elif self.type == 'steel':
-            color = GRAY
-        elif self.type == 'forest':
-            color = DARK_GREEN
-        elif self.type == 'water':
-            color = BLUE
+                with open(self.path, encoding='utf-8') as f:
+                    self.paths = json.load(f)
+            except (OSError, ValueError):
+                self.paths = {}
+        if name in self.paths:
+            path = self.paths[name]
+            if path is None or os.path.exists(path):
+                return path
+        path = pygame.font.match_font(name)
+        self.paths[name] = path
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.paths, f)
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass
+        return path
+
+    def font(self, name, size):
+        key = (name, size)
+        if key not in self.fonts:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            self.fonts[key] = pygame.font.Font(self.resolve(name), size)
+        return self.fonts[key]
+
+    def render(self, name, size, text, color):
+        # Надписи интерфейса меняются редко, готовые поверхности переиспользуются
+        key = (name, size, text, color)
+        surface = self.texts.get(key)
+        if surface is None:
+            if len(self.texts) >= TEXT_CACHE_SIZE:
+                self.texts.clear()
+            surface = self.texts[key] = self.font(name, size).render(text, True, color)
+        return surface
+
+fonts = FontCache()
+
+TILE_COLORS = {BRICK: BROWN, STEEL: GRAY, FOREST: DARK_GREEN, WATER: BLUE}
+
+# Местность рисуется кусками по CHUNK_TILES x CHUNK_TILES клеток. Куски
+# строятся при первом появлении в кадре и хранятся в LRU-кэше: давно не
+# видимые вытесняются, а при возвращении камеры строятся заново по сетке.
+CHUNK_TILES = 16
+CHUNK_PIXELS = CHUNK_TILES * TILE_SIZE
+CHUNK_CACHE_SIZE = 64
+
+# Симуляция идет фиксированными тиками независимо от частоты кадров. Если
+# кадр рисуется долго, за него выполняется несколько тиков подряд (не
+# больше MAX_TICKS_PER_FRAME), и скорость игры не меняется; отрисовка
+# ограничена RENDER_FPS кадрами в секунду (--uncapped снимает ограничение).
+TICK_RATE = 60
+MAX_TICKS_PER_FRAME = 5
+RENDER_FPS = 120
+
+class Camera:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.x = 0
+        self.y = 0
+        self.world_width = width
+        self.world_height = height
+
+    def resize(self, world_width, world_height):
+        self.world_width = world_width
+        self.world_height = world_height
+
+    def follow(self, x, y, width, height):
+        # Прямоугольник в центре экрана, у краев карты камера упирается в границу
+        x = x + width // 2 - self.width // 2
+        y = y + height // 2 - self.height // 2
+        self.x = max(0, min(self.world_width - self.width, x))
+        self.y = max(0, min(self.world_height - self.height, y))
+
+class Renderer:
+    def __init__(self, screen):
+        # Игровое поле рисуется прямо в подповерхность экрана, без новых Surface на кадр
+        self.view = screen.subsurface((0, 50, GAME_WIDTH, GAME_HEIGHT))
+        self.camera = Camera(GAME_WIDTH, GAME_HEIGHT)
+        
+        # (col, row) куска -> [слой местности, слой леса или None]
+        self.chunks = OrderedDict()
+        self.grid = None
+        
+        self.bullet_sprites = {}
+        for is_player, color in ((True, YELLOW), (False, RED)):
+            sprite = pygame.Surface((BULLET_SIZE, BULLET_SIZE)).convert()
+            sprite.fill(color)
+            self.bullet_sprites[is_player] = sprite
+        
+        atlas.preload()
+        self.tank_frames = atlas.tank_frames(TANK_SIZE, TANK_SIZE)
+        self.terrain_blits = []
+        self.forest_blits = []
+        self.entity_blits = []
+
+    def rebuild(self, grid):
+        self.grid = grid
+        self.chunks.clear()
+        self.camera.resize(grid.cols * TILE_SIZE, grid.rows * TILE_SIZE)
+
+    def chunk(self, chunk_col, chunk_row):
+        key = (chunk_col, chunk_row)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.chunks[key] = self.build_chunk(chunk_col, chunk_row)
+            if len(self.chunks) > CHUNK_CACHE_SIZE:
+                self.chunks.popitem(last=False)
         else:
-            color = BROWN
-            
-        pygame.draw.rect(screen, color, (self.x, self.y, self.width, self.height))
+            self.chunks.move_to_end(key)
+        return chunk
 
-    def get_rect(self):
-        return pygame.Rect(self.x, self.y, self.width, self.height)
+    def build_chunk(self, chunk_col, chunk_row):
+        grid = self.grid
+        col0 = chunk_col * CHUNK_TILES
+        row0 = chunk_row * CHUNK_TILES
+        cols = min(CHUNK_TILES, grid.cols - col0)
+        rows = min(CHUNK_TILES, grid.rows - row0)
+        terrain = pygame.Surface((cols * TILE_SIZE, rows * TILE_SIZE)).convert()
+        terrain.fill(BLACK)
+        chunk = [terrain, None]
+        for row in range(rows):
+            for col in range(cols):
+                tile = grid.get(col0 + col, row0 + row)
+                if tile == FOREST:
+                    if chunk[1] is None:
+                        chunk[1] = pygame.Surface(terrain.get_size(), pygame.SRCALPHA).convert_alpha()
+                        chunk[1].fill((0, 0, 0, 0))
+                    self.draw_tile(chunk[1], col, row, tile)
+                elif tile != EMPTY:
+                    self.draw_tile(terrain, col, row, tile)
+        return chunk
 
-    def collides_with_tank(self, tank):
-        if self.type == 'forest':
-            return False
-        return self.get_rect().colliderect(tank.get_rect())
+    def draw_tile(self, layer, col, row, tile):
+        image = atlas.tile(TILE_NAMES[tile])
+        if image:
+            layer.blit(image, (col * TILE_SIZE, row * TILE_SIZE))
+        else:
+            # Fallback отрисовка
+            pygame.draw.rect(layer, TILE_COLORS[tile], (col * TILE_SIZE, row * TILE_SIZE, TILE_SIZE, TILE_SIZE))
+
+    def on_tile_cleared(self, col, row, old_tile):
+        # Правим только уже построенный кусок; непостроенный возьмет клетку из сетки
+        chunk = self.chunks.get((col // CHUNK_TILES, row // CHUNK_TILES))
+        if chunk is None:
+            return
+        rect = ((col % CHUNK_TILES) * TILE_SIZE, (row % CHUNK_TILES) * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+        if old_tile == FOREST:
+            if chunk[1] is not None:
+                chunk[1].fill((0, 0, 0, 0), rect)
+        else:
+            chunk[0].fill(BLACK, rect)
 
-    def collides_with_bullet(self, bullet):
-        if self.type in ['water', 'forest']:
-            return False
-        return self.get_rect().colliderect(bullet.get_rect())
+    def draw_tank_fallback(self, surface, tank, x, y):
+        # Fallback отрисовка - упрощенная версия
+        color = GREEN if tank.is_player else RED
+        pygame.draw.rect(surface, color, (x, y, tank.width, tank.height))
+        
+        # Пушка (в зависимости от направления)
+        if tank.direction == 0:  # вверх
+            pygame.draw.rect(surface, (51, 51, 51), 
+                           (x + tank.width // 2 - 2, y - 8, 4, 12))
+        elif tank.direction == 1:  # вправо
+            pygame.draw.rect(surface, (51, 51, 51), 
+                           (x + tank.width, y + tank.height // 2 - 2, 12, 4))
+        elif tank.direction == 2:  # вниз
+            pygame.draw.rect(surface, (51, 51, 51), 
+                           (x + tank.width // 2 - 2, y + tank.height, 4, 12))
+        else:  # влево
+            pygame.draw.rect(surface, (51, 51, 51), 
+                           (x - 12, y + tank.height // 2 - 2, 12, 4))
+
+    def draw(self, world, profiler=None, alpha=1.0):
+        # alpha - доля пути танков от prev_x/prev_y к текущему положению
+        view = self.view
+        camera = self.camera
+        player = world.player
+        camera.follow(player.prev_x + int((player.x - player.prev_x) * alpha),
+                      player.prev_y + int((player.y - player.prev_y) * alpha), player.width, player.height)
+        left, top = camera.x, camera.y
+        right, bottom = left + camera.width, top + camera.height
+        
+        # Карта меньше экрана: вне ее остается черный фон
+        if camera.world_width < camera.width or camera.world_height < camera.height:
+            view.fill(BLACK)
+        
+        # Только куски, пересекающие видимую область
+        grid = self.grid
+        col0 = max(0, left // CHUNK_PIXELS)
+        row0 = max(0, top // CHUNK_PIXELS)
+        col1 = min((grid.cols - 1) // CHUNK_TILES, (right - 1) // CHUNK_PIXELS)
+        row1 = min((grid.rows - 1) // CHUNK_TILES, (bottom - 1) // CHUNK_PIXELS)
+        terrain_blits = self.terrain_blits
+        forest_blits = self.forest_blits
+        terrain_blits.clear()
+        forest_blits.clear()
+        for chunk_row in range(row0, row1 + 1):
+            for chunk_col in range(col0, col1 + 1):
+                terrain, forest = self.chunk(chunk_col, chunk_row)
+                position = (chunk_col * CHUNK_PIXELS - left, chunk_row * CHUNK_PIXELS - top)
+                terrain_blits.append((terrain, position))
+                if forest is not None:
+                    forest_blits.append((forest, position))
+        view.blits(terrain_blits, False)
+        if profiler is not None:
+            profiler.lap('draw_terrain')
+        
+        # Пули и танки в видимой области собираются в один пакет для Surface.blits
+        blits = self.entity_blits
+        blits.clear()
+        sprites = self.bullet_sprites
+        for x, y, is_player in world.bullets.visible(left, top, camera.width, camera.height, alpha):
+            blits.append((sprites[is_player], (x, y)))
+        
+        frames = self.tank_frames
+        for tank in world.players + world.enemies:
+            x = tank.prev_x + int((tank.x - tank.prev_x) * alpha)
+            y = tank.prev_y + int((tank.y - tank.prev_y) * alpha)
+            if x + tank.width <= left or x >= right or y + tank.height <= top or y >= bottom:
+                continue
+            if frames:
+                blits.append((frames[tank.direction], (x - left, y - top)))
+            else:
+                self.draw_tank_fallback(view, tank, x - left, y - top)
+        view.blits(blits, False)
+        if profiler is not None:
+            profiler.lap('draw_entities')
+        
+        if forest_blits:
+            view.blits(forest_blits, False)
+        if profiler is not None:
+            profiler.lap('draw_forest')
 
 class Game:
-    def __init__(self):
+    # Клавиши управления и соответствующие биты маски ввода
+    KEY_ACTIONS = {
+        pygame.K_w: ACTION_UP,
+        pygame.K_d: ACTION_RIGHT,
+        pygame.K_s: ACTION_DOWN,
+        pygame.K_a: ACTION_LEFT,
+        pygame.K_SPACE: ACTION_FIRE,
+    }
+
+    def __init__(self, seed=None, record_dir=None, replay=None, profile_path=None, pack_path=None,
+                 enemy_policy='random', startup_check=False, fps=RENDER_FPS, capture_path=None):
+        # Замеры фаз старта; с startup_check игра печатает их и выходит после первого кадра
+        self.startup_check = startup_check
+        self.startup = []
+        self.startup_last = STARTUP_TIME
+        self.mark_startup('импорт')
+        
+        pygame.display.init()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("Battle City - PyGame")
         self.clock = pygame.time.Clock()
-        
-        # Создаем шрифт
-        self.font = pygame.font.SysFont('Arial', 36)
-        self.small_font = pygame.font.SysFont('Arial', 24)
-        
-        self.score = 0
-        self.player_lives = 3
-        self.game_over = False
-        self.game_won = False
-        
-        self.player = None
-        self.enemies = []
-        self.walls = []
-        self.player_bullets = []
-        self.enemy_bullets = []
-        
-        self.keys = {
-            'w': False,
-            'a': False,
-            's': False,
-            'd': False,
-            'space': False
-        }
-        
-        self.init_game()
-
-    def init_game(self):
-        self.score = 0
-        self.player_lives = 3
-        self.game_over = False
-        self.game_won = False
-        
-        # Создаем игрока
-        self.player = Tank(12 * TILE_SIZE, 22 * TILE_SIZE, True)
-        
-        # Создаем врагов
-        self.enemies = [
-            Tank(3 * TILE_SIZE, 3 * TILE_SIZE),
-            Tank(22 * TILE_SIZE, 3 * TILE_SIZE),
-            Tank(3 * TILE_SIZE, 22 * TILE_SIZE),
-            Tank(22 * TILE_SIZE, 22 * TILE_SIZE)
-        ]
-        
-        self.walls = []
-        self.player_bullets = []
-        self.enemy_bullets = []
-        
-        # Границы уровня
-        for i in range(26):
-            self.walls.append(Wall(i * TILE_SIZE, 0, 'steel'))
-            self.walls.append(Wall(i * TILE_SIZE, 25 * TILE_SIZE, 'steel'))
-        
-        for i in range(1, 25):
-            self.walls.append(Wall(0, i * TILE_SIZE, 'steel'))
-            self.walls.append(Wall(25 * TILE_SIZE, i * TILE_SIZE, 'steel'))
-        
-        # Внутренние стены
-        wall_positions = [
-            # Кирпичные стены в центре
-            [10, 5, 'brick'], [11, 5, 'brick'], [12, 5, 'brick'], [13, 5, 'brick'], [14, 5, 'brick'],
-            [10, 6, 'brick'], [14, 6, 'brick'],
-            [10, 7, 'brick'], [14, 7, 'brick'],
-            [10, 8, 'brick'], [11, 8, 'brick'], [12, 8, 'brick'], [13, 8, 'brick'], [14, 8, 'brick'],
-            
-            # Стальные стены
-            [5, 10, 'steel'], [6, 10, 'steel'], [7, 10, 'steel'],
-            [5, 11, 'steel'], [7, 11, 'steel'],
-            [5, 12, 'steel'], [6, 12, 'steel'], [7, 12, 'steel'],
-            
-            [18, 10, 'steel'], [19, 10, 'steel'], [20, 10, 'steel'],
-            [18, 11, 'steel'], [20, 11, 'steel'],
-            [18, 12, 'steel'], [19, 12, 'steel'], [20, 12, 'steel'],
-            
-            # Лес
-            [8, 15, 'forest'], [9, 15, 'forest'], [10, 15, 'forest'], [11, 15, 'forest'],
-            [8, 16, 'forest'], [9, 16, 'forest'], [10, 16, 'forest'], [11, 16, 'forest'],
-            [8, 17, 'forest'], [9, 17, 'forest'], [10, 17, 'forest'], [11, 17, 'forest'],
-            
-            # Вода
-            [14, 15, 'water'], [15, 15, 'water'], [16, 15, 'water'], [17, 15, 'water'],
-            [14, 16, 'water'], [15, 16, 'water'], [16, 16, 'water'], [17, 16, 'water'],
-            [14, 17, 'water'], [15, 17, 'water'], [16, 17, 'water'], [17, 17, 'water']
-        ]
-        
-        for pos in wall_positions:
-            self.walls.append(Wall(pos[0] * TILE_SIZE, pos[1] * TILE_SIZE, pos[2]))
-        
-
-    def check_tank_wall_collision(self, tank):
-        for wall in self.walls:
-            if wall.collides_with_tank(tank):
-                return True
-        return False
-
-    def check_tank_tank_collision(self, tank, other_tanks):
-        for other_tank in other_tanks:
-            if other_tank != tank and tank.collides_with(other_tank):
-                return True
-        return False
-
-    def shoot_bullet(self, shooter, is_player):
-        if shooter.direction == 0:  # вверх
-            bullet_x = shooter.x + shooter.width // 2 - 3
-            bullet_y = shooter.y - 6
-        elif shooter.direction == 1:  # вправо
-            bullet_x = shooter.x + shooter.width
-            bullet_y = shooter.y + shooter.height // 2 - 3
-        elif shooter.direction == 2:  # вниз
-            bullet_x = shooter.x + shooter.width // 2 - 3
-            bullet_y = shooter.y + shooter.height
-        else:  # влево
-            bullet_x = shooter.x - 6
-            bullet_y = shooter.y + shooter.height // 2 - 3
-        
-        bullet = Bullet(bullet_x, bullet_y, shooter.direction, is_player)
-        
-        if is_player:
-            self.player_bullets.append(bullet)
+        # Ограничение частоты кадров; 0 - без ограничения
+        self.fps = fps
+        self.mark_startup('окно')
+        
+        # Шрифты интерфейса: пути берутся из кэша, сами шрифты открываются один раз
+        fonts.font('Arial', 36)
+        fonts.font('Arial', 24)
+        self.mark_startup('шрифты')
+        
+        # Вся игровая логика живет в мире ядра, Game только рисует и читает ввод
+        self.world = World(enemy_policy=ENEMY_POLICIES[enemy_policy])
+        self.renderer = Renderer(self.screen)
+        self.world.grid.listeners.append(self.renderer.on_tile_cleared)
+        self.mark_startup('картинки')
+        # Затемнение поля под сообщением о конце игры
+        self.dim_overlay = None
+        # Запись показанных кадров в файл (--capture)
+        self.capture = FrameCapture(capture_path, self.screen) if capture_path is not None else None
+        
+        # Удерживаемые клавиши и нажатия за текущий кадр
+        self.held_actions = 0
+        self.pressed_actions = 0
+        
+        # Профилировщик кадра: включается флагом --profile или клавишей F3
+        self.profile_path = profile_path
+        self.profiler = None
+        self.show_profiler = False
+        self.profiler_overlay = None
+        if profile_path is not None:
+            self.enable_profiler()
+        
+        # Набор уровней: индекс читается сразу, уровни - по мере прохождения
+        self.pack = LevelPack(pack_path) if pack_path is not None else None
+        self.stage = 0
+        
+        # Запись партий в файлы повторов и просмотр готового повтора
+        self.record_dir = record_dir
+        self.recording = None
+        self.replay_player = None
+        
+        # Быстрое сохранение (F5) и загрузка (F9): этап, снимок мира и запись партии на момент снимка
+        self.quick_save = None
+        
+        if replay is not None:
+            self.replay_player = ReplayPlayer(replay, self.world)
+            self.renderer.rebuild(self.world.grid)
         else:
-            self.enemy_bullets.append(bullet)
+            self.init_game(seed)
+        self.mark_startup('мир')
 
-    def check_collisions(self):
-        # Пули игрока с врагами
-        for bullet in self.player_bullets[:]:
-            if not bullet.active:
-                self.player_bullets.remove(bullet)
-                continue
-                
-            for enemy in self.enemies[:]:
-                if bullet.collides_with(enemy):
-                    bullet.active = False
-                    self.enemies.remove(enemy)
-                    self.score += 100
-                    if len(self.enemies) == 0:
-                        self.game_won = True
-                    break
-        
-        # Пули врагов с игроком
-        for bullet in self.enemy_bullets[:]:
-            if not bullet.active:
-                self.enemy_bullets.remove(bullet)
-                continue
-                
-            if bullet.collides_with(self.player):
-                bullet.active = False
-                self.player_lives -= 1
-                if self.player_lives <= 0:
-                    self.game_over = True
-        
-        # Пули со стенами
-        all_bullets = self.player_bullets + self.enemy_bullets
-        for bullet in all_bullets[:]:
-            if not bullet.active:
-                if bullet in self.player_bullets:
-                    self.player_bullets.remove(bullet)
-                else:
-                    self.enemy_bullets.remove(bullet)
-                continue
-                
-            for wall in self.walls[:]:
-                if wall.collides_with_bullet(bullet):
-                    bullet.active = False
-                    if wall.type == 'brick':
-                        self.walls.remove(wall)
-                    break
-
-    def update_enemies(self):
-        for enemy in self.enemies:
-            old_x, old_y = enemy.move()
-            
-            collided = (self.check_tank_wall_collision(enemy) or 
-                       self.check_tank_tank_collision(enemy, self.enemies) or 
-                       enemy.collides_with(self.player))
-            
-            if collided:
-                enemy.x, enemy.y = old_x, old_y
-                enemy.direction = random.randint(0, 3)
-            else:
-                if random.random() < 0.01:
-                    enemy.direction = random.randint(0, 3)
-            
-            if random.random() < 0.01:
-                self.shoot_bullet(enemy, False)
+    def mark_startup(self, phase):
+        now = time.perf_counter()
+        self.startup.append((phase, now - self.startup_last))
+        self.startup_last = now
+
+    def startup_report(self):
+        phases = ', '.join(f'{phase} {seconds * 1000:.1f}' for phase, seconds in self.startup)
+        total = self.startup_last - STARTUP_TIME
+        return f'старт до первого кадра: {total * 1000:.1f} мс ({phases})'
+
+    def init_game(self, seed=None):
+        if self.replay_player is not None:
+            self.replay_player.restart()
+            self.renderer.rebuild(self.world.grid)
+            return
+        
+        self.save_recording()
+        level = self.pack.stage(self.stage) if self.pack is not None else None
+        self.world.reset(seed, level)
+        self.renderer.rebuild(self.world.grid)
+        if self.record_dir is not None:
+            self.recording = Replay(self.world.seed, enemy_policy_name(self.world.enemy_policy),
+                                    level=level.name if level is not None else None)
+
+    def has_next_stage(self):
+        return self.pack is not None and self.stage + 1 < len(self.pack)
+
+    def next_stage(self):
+        if self.world.game_won and self.has_next_stage():
+            self.stage += 1
+            self.init_game()
+
+    def save_quick(self):
+        if self.replay_player is not None:
+            return
+        recording = self.recording
+        if recording is not None:
+            recording = Replay(recording.seed, recording.enemy_policy, recording.actions, level=recording.level)
+        self.quick_save = (self.stage, self.world.level, snapshot.save(self.world), recording)
+
+    def load_quick(self):
+        if self.quick_save is None or self.replay_player is not None:
+            return
+        self.stage, level, data, recording = self.quick_save
+        world = self.world
+        generation = world.grid.generation
+        world.level = level
+        snapshot.restore(world, data)
+        if world.grid.generation != generation:
+            self.renderer.rebuild(world.grid)
+        # Запись продолжается с момента снимка, ходы после него отбрасываются
+        if recording is not None:
+            recording = Replay(recording.seed, recording.enemy_policy, recording.actions, level=recording.level)
+        self.recording = recording
+
+    def enable_profiler(self):
+        if self.profiler is None:
+            # Без файла для выгрузки покадровые записи не копятся
+            self.profiler = FrameProfiler(keep_records=self.profile_path is not None)
+            self.world.profiler = self.profiler
+
+    def save_recording(self):
+        if self.recording is None or not self.recording.actions:
+            return
+        self.recording.finish(self.world)
+        os.makedirs(self.record_dir, exist_ok=True)
+        path = os.path.join(self.record_dir, f'{time.strftime("%Y%m%d-%H%M%S")}-{self.recording.seed}.bcr')
+        self.recording.save(path)
+        print(f"Повтор сохранен: {path}")
+        self.recording = None
 
     def handle_events(self):
         for event in pygame.event.get():
@@ -395,142 +502,177 @@ class Game:
                 return False
             
             elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_w:
-                    self.keys['w'] = True
-                    self.player.direction = 0
-                elif event.key == pygame.K_a:
-                    self.keys['a'] = True
-                    self.player.direction = 3
-                elif event.key == pygame.K_s:
-                    self.keys['s'] = True
-                    self.player.direction = 2
-                elif event.key == pygame.K_d:
-                    self.keys['d'] = True
-                    self.player.direction = 1
-                elif event.key == pygame.K_SPACE:
-                    if not self.keys['space'] and not self.game_over and not self.game_won:
-                        self.keys['space'] = True
-                        self.shoot_bullet(self.player, True)
+                action = self.KEY_ACTIONS.get(event.key)
+                if action is not None:
+                    self.held_actions |= action
+                    # Нажатие запоминается, даже если клавишу отпустили в том же кадре
+                    self.pressed_actions |= action
                 elif event.key == pygame.K_r:
                     self.init_game()
+                elif event.key == pygame.K_n:
+                    self.next_stage()
+                elif event.key == pygame.K_F3:
+                    self.enable_profiler()
+                    self.show_profiler = not self.show_profiler
+                elif event.key == pygame.K_F5:
+                    self.save_quick()
+                elif event.key == pygame.K_F9:
+                    self.load_quick()
             
             elif event.type == pygame.KEYUP:
-                if event.key == pygame.K_w:
-                    self.keys['w'] = False
-                elif event.key == pygame.K_a:
-                    self.keys['a'] = False
-                elif event.key == pygame.K_s:
-                    self.keys['s'] = False
-                elif event.key == pygame.K_d:
-                    self.keys['d'] = False
-                elif event.key == pygame.K_SPACE:
-                    self.keys['space'] = False
+                action = self.KEY_ACTIONS.get(event.key)
+                if action is not None:
+                    self.held_actions &= ~action
         
         return True
 
     def update(self):
-        if self.game_over or self.game_won:
+        if self.replay_player is not None:
+            self.replay_player.step()
             return
         
-        # Движение игрока
-        if any([self.keys['w'], self.keys['a'], self.keys['s'], self.keys['d']]):
-            old_x, old_y = self.player.move()
-            
-            if (self.check_tank_wall_collision(self.player) or 
-                self.check_tank_tank_collision(self.player, self.enemies)):
-                self.player.x, self.player.y = old_x, old_y
-        
-        # Обновление врагов
-        self.update_enemies()
-        
-        # Обновление пуль
-        for bullet in self.player_bullets:
-            bullet.update()
-        for bullet in self.enemy_bullets:
-            bullet.update()
-        
-        # Проверка столкновений
-        self.check_collisions()
+        actions = self.held_actions | self.pressed_actions
+        self.pressed_actions = 0
+        if self.recording is not None and not self.world.done:
+            self.recording.record(actions)
+        self.world.step(actions)
 
-    def draw(self):
+    def draw(self, alpha=1.0):
         # Очистка экрана
         self.screen.fill(BLACK)
         
-        # Отрисовка игрового поля
-        game_surface = pygame.Surface((GAME_WIDTH, GAME_HEIGHT))
-        game_surface.fill(BLACK)
-        
-        # Отрисовка стен
-        for wall in self.walls:
-            wall.draw(game_surface)
-        
-        # Отрисовка пуль
-        for bullet in self.player_bullets:
-            if bullet.active:
-                bullet.draw(game_surface)
-        for bullet in self.enemy_bullets:
-            if bullet.active:
-                bullet.draw(game_surface)
-        
-        # Отрисовка танков
-        self.player.draw(game_surface)
-        for enemy in self.enemies:
-            enemy.draw(game_surface)
-        
-        # Отображаем игровое поле на основном экране
-        self.screen.blit(game_surface, (0, 50))
+        # Отрисовка игрового поля по слоям, alpha - доля следующего тика
+        self.renderer.draw(self.world, self.profiler, alpha)
         
         # Отрисовка интерфейса
         pygame.draw.rect(self.screen, (50, 50, 50), (0, 0, SCREEN_WIDTH, 50))
         
         # Счет и жизни
-        score_text = self.font.render(f'Очки: {self.score}', True, WHITE)
-        lives_text = self.font.render(f'Жизни: {self.player_lives}', True, WHITE)
+        score_text = fonts.render('Arial', 36, f'Очки: {self.world.score}', WHITE)
+        lives_text = fonts.render('Arial', 36, f'Жизни: {self.world.player_lives}', WHITE)
         
         self.screen.blit(score_text, (10, 10))
         self.screen.blit(lives_text, (SCREEN_WIDTH - 150, 10))
         
         # Управление
-        controls_text = self.small_font.render('Управление: WASD - движение, ПРОБЕЛ - стрельба, R - перезапуск', True, WHITE)
+        controls_text = fonts.render('Arial', 24, 'Управление: WASD - движение, ПРОБЕЛ - стрельба, R - перезапуск', WHITE)
         self.screen.blit(controls_text, (SCREEN_WIDTH // 2 - controls_text.get_width() // 2, GAME_HEIGHT + 55))
         
         # Сообщения о конце игры
-        if self.game_over:
-            overlay = pygame.Surface((GAME_WIDTH, GAME_HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 180))
-            self.screen.blit(overlay, (0, 50))
+        if self.world.done and self.dim_overlay is None:
+            self.dim_overlay = pygame.Surface((GAME_WIDTH, GAME_HEIGHT), pygame.SRCALPHA)
+            self.dim_overlay.fill((0, 0, 0, 180))
+        
+        if self.world.game_over:
+            self.screen.blit(self.dim_overlay, (0, 50))
             
-            game_over_text = self.font.render('ИГРА ОКОНЧЕНА', True, RED)
-            score_text = self.font.render(f'Счет: {self.score}', True, WHITE)
-            restart_text = self.small_font.render('Нажми R для перезапуска', True, WHITE)
+            game_over_text = fonts.render('Arial', 36, 'ИГРА ОКОНЧЕНА', RED)
+            score_text = fonts.render('Arial', 36, f'Счет: {self.world.score}', WHITE)
+            restart_text = fonts.render('Arial', 24, 'Нажми R для перезапуска', WHITE)
             
             self.screen.blit(game_over_text, (SCREEN_WIDTH // 2 - game_over_text.get_width() // 2, GAME_HEIGHT // 2 - 20 + 50))
             self.screen.blit(score_text, (SCREEN_WIDTH // 2 - score_text.get_width() // 2, GAME_HEIGHT // 2 + 20 + 50))
             self.screen.blit(restart_text, (SCREEN_WIDTH // 2 - restart_text.get_width() // 2, GAME_HEIGHT // 2 + 60 + 50))
         
-        elif self.game_won:
-            overlay = pygame.Surface((GAME_WIDTH, GAME_HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 180))
-            self.screen.blit(overlay, (0, 50))
+        elif self.world.game_won:
+            self.screen.blit(self.dim_overlay, (0, 50))
             
-            win_text = self.font.render('ПОБЕДА!', True, GREEN)
-            score_text = self.font.render(f'Счет: {self.score}', True, WHITE)
-            restart_text = self.small_font.render('Нажми R для перезапуска', True, WHITE)
+            win_text = fonts.render('Arial', 36, 'ПОБЕДА!', GREEN)
+            score_text = fonts.render('Arial', 36, f'Счет: {self.world.score}', WHITE)
+            if self.has_next_stage():
+                restart_text = fonts.render('Arial', 24, 'N - следующий уровень, R - заново', WHITE)
+            else:
+                restart_text = fonts.render('Arial', 24, 'Нажми R для перезапуска', WHITE)
             
             self.screen.blit(win_text, (SCREEN_WIDTH // 2 - win_text.get_width() // 2, GAME_HEIGHT // 2 - 20 + 50))
             self.screen.blit(score_text, (SCREEN_WIDTH // 2 - score_text.get_width() // 2, GAME_HEIGHT // 2 + 20 + 50))
             self.screen.blit(restart_text, (SCREEN_WIDTH // 2 - restart_text.get_width() // 2, GAME_HEIGHT // 2 + 60 + 50))
         
+        if self.show_profiler:
+            self.draw_profiler_overlay()
+        
+        if self.profiler is not None:
+            self.profiler.lap('draw_hud')
         pygame.display.flip()
+        if self.profiler is not None:
+            self.profiler.lap('flip')
+        if self.capture is not None:
+            self.capture.grab(self.screen)
+            if self.profiler is not None:
+                self.profiler.lap('capture')
+
+    def draw_profiler_overlay(self):
+        # Текст оверлея перерисовывается раз в полсекунды, а не каждый кадр
+        profiler = self.profiler
+        if self.profiler_overlay is None or profiler.frame % 30 == 0:
+            overlay_font = fonts.font('Consolas', 13)
+            lines = ['фаза            p50    p95    p99 мс']
+            for name, (p50, p95, p99) in profiler.summary().items():
+                lines.append(f'{name:<14}{p50:6.2f} {p95:6.2f} {p99:6.2f}')
+            lines.append(', '.join(f'{name}: {value}' for name, value in profiler.counts.items()))
+            
+            line_height = overlay_font.get_linesize()
+            overlay = pygame.Surface((GAME_WIDTH, line_height * len(lines) + 8), pygame.SRCALPHA)
+            overlay.fill((0, 0, 0, 170))
+            for i, line in enumerate(lines):
+                overlay.blit(overlay_font.render(line, True, WHITE), (6, 4 + i * line_height))
+            self.profiler_overlay = overlay
+        self.screen.blit(self.profiler_overlay, (0, 50))
 
     def run(self):
+        # Накопленное реальное время расходуется на тики фиксированной длины,
+        # остаток - доля следующего тика для интерполяции положений на кадре
+        tick_seconds = 1.0 / TICK_RATE
+        accumulator = 0.0
+        moving = False
+        frames = 0
+        ticks = 0
+        started = previous = time.perf_counter()
         running = True
         while running:
+            profiler = self.profiler
+            if profiler is not None:
+                profiler.begin_frame()
             running = self.handle_events()
-            self.update()
-            self.draw()
-            self.clock.tick(60)  # 60 FPS
-        
+            if profiler is not None:
+                profiler.lap('events')
+            
+            now = time.perf_counter()
+            accumulator += now - previous
+            previous = now
+            frame_ticks = 0
+            while accumulator >= tick_seconds and frame_ticks < MAX_TICKS_PER_FRAME:
+                tick = self.world.tick
+                self.update()
+                # Стоящий мир (конец игры, конец повтора) рисуется без интерполяции
+                moving = self.world.tick != tick
+                accumulator -= tick_seconds
+                frame_ticks += 1
+            if accumulator >= tick_seconds:
+                # Не успеваем и с пропуском кадров: игра замедляется, а не копит долг
+                accumulator %= tick_seconds
+            
+            self.draw(accumulator / tick_seconds if moving else 1.0)
+            frames += 1
+            ticks += frame_ticks
+            if profiler is not None:
+                profiler.end_frame(enemies=len(self.world.enemies), bullets=self.world.bullets.count, ticks=frame_ticks)
+            if self.startup_check:
+                self.mark_startup('первый кадр')
+                print(self.startup_report())
+                break
+            self.clock.tick(self.fps)
+        
+        if not self.fps:
+            elapsed = time.perf_counter() - started
+            print(f"Кадров в секунду: {frames / elapsed:.1f}, тиков в секунду: {ticks / elapsed:.1f}")
+        self.save_recording()
+        if self.capture is not None:
+            self.capture.close()
+            print(self.capture.report())
+        if self.profiler is not None and self.profile_path is not None:
+            self.profiler.dump(self.profile_path)
+            print(f"Профиль кадров сохранен: {self.profile_path}")
         pygame.quit()
 
 if __name__ == "__main__":
@@ -540,5 +682,25 @@ if __name__ == "__main__":
         print("Создана папка assets. Добавьте туда файлы: tank.png, brick.png, steel.png, forest.png, water.png")
         print("Игра будет использовать fallback-отрисовку")
     
-    game = Game()
+    parser = argparse.ArgumentParser(description='Battle City - PyGame')
+    parser.add_argument('--seed', type=int, default=None, help='seed партии (по умолчанию случайный)')
+    parser.add_argument('--record', metavar='DIR', default=None, help='сохранять повторы партий в папку')
+    parser.add_argument('--replay', metavar='FILE', default=None, help='показать сохраненный повтор')
+    parser.add_argument('--profile', metavar='FILE', default=None,
+                        help='профилировать кадры и сохранить записи в .csv или .json при выходе (F3 - оверлей)')
+    parser.add_argument('--pack', metavar='FILE', default=os.path.join('levels', 'pack.json'),
+                        help='индекс набора уровней (если файла нет - встроенная карта)')
+    parser.add_argument('--enemy', choices=sorted(ENEMY_POLICIES), default='random', help='поведение врагов')
+    parser.add_argument('--fps', type=int, default=RENDER_FPS, help='ограничение частоты кадров отрисовки')
+    parser.add_argument('--uncapped', action='store_true',
+                        help='рисовать без ограничения частоты кадров и напечатать кадры и тики в секунду при выходе')
+    parser.add_argument('--capture', metavar='FILE', default=None,
+                        help='записывать показанные кадры в файл (просмотр и выгрузка в PNG - capture.py)')
+    parser.add_argument('--startup-check', action='store_true',
+                        help='напечатать время старта по фазам и выйти после первого кадра')
+    args = parser.parse_args()
+    
+    pack_path = args.pack if os.path.exists(args.pack) else None
+    game = Game(args.seed, args.record, Replay.load(args.replay) if args.replay else None, args.profile, pack_path,
+                args.enemy, args.startup_check, 0 if args.uncapped else args.fps, args.capture)
     game.run()
\ No newline at end of file
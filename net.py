@@ -0,0 +1,229 @@
+import struct
+import zlib
+
+from core import BULLET_SIZE, BULLET_STEPS, TileGrid, Tank
+
+# Протокол сетевой игры поверх TCP.
+#
+# Клиент -> сервер: поток байтов, каждый байт - текущая маска ввода
+# (те же биты, что в core.ACTION_*). Клиент отправляет байт только при
+# изменении маски.
+#
+# Сервер -> клиент: кадры "тип (1 байт), длина (4 байта), данные":
+#   WELCOME  слот игрока и частота тиков сервера
+#   MAP      размер карты и сжатые zlib клетки (при входе и в начале раунда)
+#   DELTA    изменения за тик: заголовок с тиком, счетом и жизнями, затем
+#            изменившиеся и исчезнувшие танки, новые и исчезнувшие пули
+#            и разрушенные клетки
+#
+# Снимок кодируется один раз за тик и рассылается всем клиентам одними и
+# теми же байтами, поэтому работа сервера на игрока не зависит от их числа.
+# Пуля летит прямо с постоянной скоростью, так что о ней сообщается только
+# при появлении и исчезновении - положение клиент считает сам.
+
+MSG_WELCOME = 1
+MSG_MAP = 2
+MSG_DELTA = 3
+
+FRAME = struct.Struct('<BI')
+WELCOME = struct.Struct('<BH')
+MAP_HEADER = struct.Struct('<HH')
+# тик, счет, жизни, конец игры, победа
+DELTA_HEADER = struct.Struct('<IiiBB')
+COUNT = struct.Struct('<H')
+# номер, x, y, направление, танк игрока
+TANK = struct.Struct('<HhhBB')
+TANK_ID = struct.Struct('<H')
+# номер выстрела, x, y, направление, пуля игрока
+BULLET = struct.Struct('<IhhBB')
+SERIAL = struct.Struct('<I')
+CELL = struct.Struct('<HH')
+
+class ProtocolError(Exception):
+    pass
+
+def frame(kind, payload):
+    return FRAME.pack(kind, len(payload)) + payload
+
+async def read_frame(reader):
+    header = await reader.readexactly(FRAME.size)
+    kind, length = FRAME.unpack(header)
+    return kind, await reader.readexactly(length)
+
+def encode_map(grid):
+    return MAP_HEADER.pack(grid.cols, grid.rows) + zlib.compress(bytes(grid.tiles), 6)
+
+def pack_items(item, records):
+    return COUNT.pack(len(records)) + b''.join(item.pack(*record) for record in records)
+
+class DeltaEncoder:
+    # Серверная сторона: помнит, что уже разослано, и кодирует разницу
+    def __init__(self, world):
+        self.world = world
+        self.tanks = {}
+        self.bullets = {}
+        self.cleared = []
+        world.grid.listeners.append(self.on_tile_cleared)
+
+    def on_tile_cleared(self, col, row, old_tile):
+        self.cleared.append((col, row))
+
+    def restart(self):
+        # Новая карта уходит кадром MAP, разница считается с пустого состояния
+        self.tanks = {}
+        self.bullets = {}
+        self.cleared = []
+
+    def header(self):
+        world = self.world
+        return DELTA_HEADER.pack(world.tick, world.score, world.player_lives, world.game_over, world.game_won)
+
+    def encode(self):
+        world = self.world
+        changed = []
+        tanks = {}
+        for tank in world.players + world.enemies:
+            state = (tank.x, tank.y, tank.direction, tank.is_player)
+            tanks[tank.id] = state
+            if self.tanks.get(tank.id) != state:
+                changed.append((tank.id,) + state)
+        removed = [(tank_id,) for tank_id in self.tanks if tank_id not in tanks]
+        self.tanks = tanks
+
+        store = world.bullets
+        n = store.count
+        bullets = {}
+        spawned = []
+        for serial, x, y, direction, is_player, active in zip(
+                store.serial[:n].tolist(), store.x[:n].tolist(), store.y[:n].tolist(),
+                store.direction[:n].tolist(), store.is_player[:n].tolist(), store.active[:n].tolist()):
+            if not active:
+                continue
+            serial &= 0xFFFFFFFF
+            bullets[serial] = (x, y, direction, is_player)
+            if serial not in self.bullets:
+                spawned.append((serial, x, y, direction, is_player))
+        gone = [(serial,) for serial in self.bullets if serial not in bullets]
+        self.bullets = bullets
+
+        cleared = self.cleared
+        self.cleared = []
+        return (self.header() + pack_items(TANK, changed) + pack_items(TANK_ID, removed) +
+                pack_items(BULLET, spawned) + pack_items(SERIAL, gone) + pack_items(CELL, cleared))
+
+    def full(self):
+        # Все, что уже разослано, одним снимком - для только что вошедшего клиента
+        tanks = [(tank_id,) + state for tank_id, state in self.tanks.items()]
+        bullets = [(serial,) + state for serial, state in self.bullets.items()]
+        return (self.header() + pack_items(TANK, tanks) + pack_items(TANK_ID, []) +
+                pack_items(BULLET, bullets) + pack_items(SERIAL, []) + pack_items(CELL, []))
+
+class MirrorBullets:
+    # Пули на клиенте: точка и тик появления, положение вычисляется на любой момент
+    def __init__(self):
+        self.items = {}
+        self.tick = 0
+
+    def clear(self):
+        self.items.clear()
+
+    def visible(self, left=0, top=0, width=None, height=None, alpha=1.0):
+        # alpha - доля пути от прошлого снимка к последнему, как у World.bullets
+        time = self.tick - 1 + alpha
+        out = []
+        for x, y, direction, is_player, tick in self.items.values():
+            dx, dy = BULLET_STEPS[direction]
+            x = int(x + dx * (time - tick)) - left
+            y = int(y + dy * (time - tick)) - top
+            if width is None or (-BULLET_SIZE < x < width and -BULLET_SIZE < y < height):
+                out.append((x, y, is_player))
+        return out
+
+class Mirror:
+    # Клиентская копия мира по снимкам сервера. Повторяет атрибуты World,
+    # которые читают Renderer и политики игрока: grid, player, players,
+    # enemies, bullets, tick, score, player_lives.
+    def __init__(self):
+        self.slot = None
+        self.tick_rate = 60
+        self.grid = TileGrid(1, 1)
+        self.tanks = {}
+        self.player = None
+        self.players = []
+        self.enemies = []
+        self.bullets = MirrorBullets()
+        self.tick = 0
+        self.score = 0
+        self.player_lives = 0
+        self.game_over = False
+        self.game_won = False
+
+    @property
+    def done(self):
+        return self.game_over or self.game_won
+
+    def apply(self, kind, payload):
+        if kind == MSG_WELCOME:
+            self.slot, self.tick_rate = WELCOME.unpack(payload)
+        elif kind == MSG_MAP:
+            cols, rows = MAP_HEADER.unpack_from(payload)
+            tiles = zlib.decompress(payload[MAP_HEADER.size:])
+            if len(tiles) != cols * rows:
+                raise ProtocolError('размер карты не совпадает с заголовком')
+            if (cols, rows) != (self.grid.cols, self.grid.rows):
+                self.grid.resize(cols, rows)
+            self.grid.load(tiles)
+            self.tanks.clear()
+            self.bullets.clear()
+        elif kind == MSG_DELTA:
+            self.apply_delta(payload)
+        else:
+            raise ProtocolError(f'неизвестный тип кадра {kind}')
+
+    def apply_delta(self, payload):
+        (self.tick, self.score, self.player_lives,
+         self.game_over, self.game_won) = DELTA_HEADER.unpack_from(payload)
+        offset = DELTA_HEADER.size
+
+        # Положения до этого снимка - для интерполяции между снимками
+        for tank in self.tanks.values():
+            tank.prev_x, tank.prev_y = tank.x, tank.y
+
+        records, offset = self.read_items(TANK, payload, offset)
+        for number, x, y, direction, is_player in records:
+            tank = self.tanks.get(number)
+            if tank is None:
+                tank = self.tanks[number] = Tank(x, y, bool(is_player))
+                tank.id = number
+            tank.x, tank.y, tank.direction = x, y, direction
+        records, offset = self.read_items(TANK_ID, payload, offset)
+        for (number,) in records:
+            self.tanks.pop(number, None)
+
+        items = self.bullets.items
+        self.bullets.tick = self.tick
+        records, offset = self.read_items(BULLET, payload, offset)
+        for serial, x, y, direction, is_player in records:
+            items[serial] = (x, y, direction, bool(is_player), self.tick)
+        records, offset = self.read_items(SERIAL, payload, offset)
+        for (serial,) in records:
+            items.pop(serial, None)
+
+        records, offset = self.read_items(CELL, payload, offset)
+        for col, row in records:
+            self.grid.clear(col, row)
+
+        self.players = sorted((tank for tank in self.tanks.values() if tank.is_player), key=tank_id)
+        self.enemies = sorted((tank for tank in self.tanks.values() if not tank.is_player), key=tank_id)
+        self.player = self.tanks.get(self.slot)
+
+    def read_items(self, item, payload, offset):
+        (count,) = COUNT.unpack_from(payload, offset)
+        offset += COUNT.size
+        end = offset + count * item.size
+        if end > len(payload):
+            raise ProtocolError('обрезанный снимок')
+        return list(item.iter_unpack(payload[offset:end])), end
+
+def tank_id(tank):
+    return tank.id
@@ -0,0 +1,155 @@
+import random
+
+from core import ACTION_FIRE, ACTION_MOVE, TANK_SIZE, TILE_SIZE, random_enemy_policy
+from flowfield import NEIGHBOURS, FlowField
+from sightlines import line_of_fire
+
+# Политики для headless-матчей. Политика игрока: fn(world) -> маска ввода,
+# политика врагов: fn(world, enemy, collided) -> (direction, fire).
+# Фабрики принимают seed, чтобы матч полностью определялся своим номером.
+
+def idle_player(seed):
+    def policy(world):
+        return 0
+    return policy
+
+def random_player(seed):
+    rng = random.Random(seed)
+    state = {'move': 0}
+
+    def policy(world):
+        # Раз в 20 тиков выбираем новое направление (или стоим на месте)
+        if world.tick % 20 == 0:
+            direction = rng.randint(0, 4)
+            state['move'] = 1 << direction if direction < 4 else 0
+        fire = ACTION_FIRE if rng.random() < 0.1 else 0
+        return state['move'] | fire
+    return policy
+
+def hunter_player(seed):
+    def policy(world):
+        player = world.player
+        if not world.enemies:
+            return 0
+        target = min(world.enemies, key=lambda enemy: abs(enemy.x - player.x) + abs(enemy.y - player.y))
+        dx = target.x - player.x
+        dy = target.y - player.y
+
+        # На одной линии с врагом: поворачиваемся к нему и стреляем через тик
+        if abs(dx) < TANK_SIZE // 2:
+            direction = 2 if dy > 0 else 0
+            fire = world.tick % 2 == 0
+        elif abs(dy) < TANK_SIZE // 2:
+            direction = 1 if dx > 0 else 3
+            fire = world.tick % 2 == 0
+        else:
+            # Выходим на линию врага по оси с меньшим расстоянием
+            if abs(dx) < abs(dy):
+                direction = 1 if dx > 0 else 3
+            else:
+                direction = 2 if dy > 0 else 0
+            fire = False
+
+        actions = 1 << direction
+        if fire:
+            actions |= ACTION_FIRE
+        if direction == player.direction and fire:
+            actions &= ~ACTION_MOVE
+        return actions
+    return policy
+
+# На сколько пикселей враг может сдвинуться вбок, чтобы повернуть точно
+# по клеткам (как в оригинальной игре)
+TURN_SNAP = 4
+
+def snap_to_node(world, enemy, col, row, direction):
+    # Выравнивание по оси, поперечной новому направлению; False - слишком далеко или занято
+    old_x, old_y = enemy.x, enemy.y
+    if direction % 2 == 0:
+        offset = col * TILE_SIZE - enemy.x
+        enemy.x += offset
+    else:
+        offset = row * TILE_SIZE - enemy.y
+        enemy.y += offset
+    if offset == 0:
+        return True
+    if (abs(offset) > TURN_SNAP or world.check_tank_wall_collision(enemy) or
+            world.check_tank_tank_collision(enemy)):
+        enemy.x, enemy.y = old_x, old_y
+        return False
+    return True
+
+def pursue_enemy_policy(world, enemy, collided):
+    # Движение к игроку по общему полю расстояний; кирпич на пути простреливается
+    field = world.flow_field
+    if field is None:
+        field = world.flow_field = FlowField(world.grid)
+    field.update_goal(world.player, world.steps)
+
+    col = (enemy.x + TILE_SIZE // 2) // TILE_SIZE
+    row = (enemy.y + TILE_SIZE // 2) // TILE_SIZE
+    direction = field.best_direction(col, row)
+    if direction is None:
+        # Пути нет или враг уже у цели
+        return random_enemy_policy(world, enemy, collided)
+
+    rng = world.rng
+    dc, dr = NEIGHBOURS[direction]
+    blocked_by_brick = collided and direction == enemy.direction and field.is_brick(col + dc, row + dr)
+    fire = world.chance(0.1 if blocked_by_brick else 0.01)
+
+    if collided and direction == enemy.direction and not blocked_by_brick:
+        # Уперлись в другой танк: сворачиваем в случайную сторону
+        direction = rng.randint(0, 3)
+    if direction % 2 != enemy.direction % 2 and not snap_to_node(world, enemy, col, row, direction):
+        # Повернуть можно только рядом с узлом; иначе едем дальше или назад
+        direction = (enemy.direction + 2) % 4 if collided else enemy.direction
+    return direction, fire
+
+# Пауза между прицельными выстрелами одного врага, в тиках
+AIMED_FIRE_COOLDOWN = 60
+
+def aimed_target(world, enemy):
+    # Прицельная стрельба вместо случайной: направление выстрела, если игрок
+    # на линии огня и пуля не упрется в стену, не чаще раза в AIMED_FIRE_COOLDOWN тиков
+    if world.tick < enemy.reload_tick:
+        return None
+    return line_of_fire(world, enemy)
+
+def aimed_enemy_policy(world, enemy, collided):
+    direction, _ = random_enemy_policy(world, enemy, collided)
+    target = aimed_target(world, enemy)
+    if target is None:
+        return direction, False
+    enemy.reload_tick = world.tick + AIMED_FIRE_COOLDOWN
+    return target, True
+
+def pursue_aimed_enemy_policy(world, enemy, collided):
+    direction, fire = pursue_enemy_policy(world, enemy, collided)
+    # Случайные выстрелы убираем, стрельбу по кирпичу на пути оставляем
+    fire = fire and collided and direction == enemy.direction
+    target = aimed_target(world, enemy)
+    # Поворот к игроку поперек движения сбил бы выравнивание по клеткам
+    if target is not None and target % 2 == direction % 2:
+        enemy.reload_tick = world.tick + AIMED_FIRE_COOLDOWN
+        return target, True
+    return direction, fire
+
+PLAYER_POLICIES = {
+    'idle': idle_player,
+    'random': random_player,
+    'hunter': hunter_player,
+}
+
+ENEMY_POLICIES = {
+    'random': random_enemy_policy,
+    'pursue': pursue_enemy_policy,
+    'aimed': aimed_enemy_policy,
+    'pursue_aimed': pursue_aimed_enemy_policy,
+}
+
+def enemy_policy_name(policy):
+    for name, known in ENEMY_POLICIES.items():
+        if known is policy:
+            return name
+    raise KeyError(f'политика врагов не зарегистрирована: {policy!r}')
@@ -0,0 +1,78 @@
+import csv
+import json
+import time
+from collections import deque
+
+# Покадровый профилировщик: время по фазам кадра, скользящие перцентили
+# и выгрузка покадровых записей в CSV или JSON.
+#
+# Фазы отмечаются вызовом lap(name): время с предыдущей отметки (или с
+# начала кадра) записывается в фазу name. Без профилировщика код игры
+# только проверяет, что ссылка на него равна None.
+
+class FrameProfiler:
+    def __init__(self, window=600, keep_records=True):
+        self.window = window
+        self.keep_records = keep_records
+        self.history = {}
+        self.records = []
+        self.frame = 0
+        self.current = {}
+        self.counts = {}
+        self.frame_start = 0.0
+        self.last = 0.0
+
+    def begin_frame(self):
+        self.current = {}
+        self.frame_start = self.last = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.current[name] = self.current.get(name, 0.0) + (now - self.last)
+        self.last = now
+
+    def end_frame(self, **counts):
+        now = time.perf_counter()
+        self.current['frame'] = now - self.frame_start
+        for name, seconds in self.current.items():
+            history = self.history.get(name)
+            if history is None:
+                history = self.history[name] = deque(maxlen=self.window)
+            history.append(seconds)
+        self.counts = counts
+        if self.keep_records:
+            record = {'frame': self.frame}
+            record.update((f'{name}_ms', round(seconds * 1000.0, 4)) for name, seconds in self.current.items())
+            record.update(counts)
+            self.records.append(record)
+        self.frame += 1
+
+    def percentiles(self, name, points=(50, 95, 99)):
+        # Перцентили по ближайшему рангу в миллисекундах
+        history = self.history.get(name)
+        if not history:
+            return tuple(0.0 for _ in points)
+        ordered = sorted(history)
+        last = len(ordered) - 1
+        return tuple(ordered[min(last, (len(ordered) * point) // 100)] * 1000.0 for point in points)
+
+    def summary(self):
+        return {name: self.percentiles(name) for name in self.history}
+
+    def dump(self, path):
+        if path.endswith('.json'):
+            with open(path, 'w') as f:
+                json.dump({'summary_ms': {name: dict(zip(('p50', 'p95', 'p99'), values))
+                                          for name, values in self.summary().items()},
+                           'frames': self.records}, f, ensure_ascii=False, indent=1)
+            return
+
+        fields = []
+        for record in self.records:
+            for key in record:
+                if key not in fields:
+                    fields.append(key)
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fields)
+            writer.writeheader()
+            writer.writerows(self.records)
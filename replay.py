@@ -0,0 +1,190 @@
+import argparse
+import struct
+import sys
+import time
+import zlib
+
+from core import World
+from levels import load_level
+from policies import ENEMY_POLICIES
+
+# Формат повтора: заголовок, затем сжатый zlib поток серий масок ввода.
+# Каждая серия - байт маски и длина серии в varint. Маска меняется редко,
+# поэтому минуты игры занимают единицы килобайт.
+#
+# Заголовок: magic, версия, seed, число тиков, контрольная сумма конечного
+# состояния, имя политики врагов и (с версии 2) путь к файлу уровня.
+
+REPLAY_MAGIC = b'BCRP'
+REPLAY_VERSION = 2
+REPLAY_HEADER = struct.Struct('<4sBQIIB')
+LEVEL_FIELD = struct.Struct('<H')
+
+class ReplayError(Exception):
+    pass
+
+def encode_runs(actions):
+    out = bytearray()
+    i = 0
+    n = len(actions)
+    while i < n:
+        mask = actions[i]
+        j = i + 1
+        while j < n and actions[j] == mask:
+            j += 1
+        out.append(mask)
+        run = j - i
+        while run >= 0x80:
+            out.append((run & 0x7F) | 0x80)
+            run >>= 7
+        out.append(run)
+        i = j
+    return bytes(out)
+
+def decode_runs(data):
+    actions = bytearray()
+    i = 0
+    n = len(data)
+    while i < n:
+        mask = data[i]
+        i += 1
+        run = 0
+        shift = 0
+        while True:
+            if i >= n:
+                raise ReplayError('обрезанный поток серий')
+            byte = data[i]
+            i += 1
+            run |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        actions += bytes([mask]) * run
+    return actions
+
+class Replay:
+    def __init__(self, seed, enemy_policy='random', actions=None, checksum=0, level=None):
+        self.seed = seed
+        self.enemy_policy = enemy_policy
+        # Путь к файлу уровня; None - встроенная классическая карта
+        self.level = level
+        # Маска ввода на каждый тик, индекс - номер тика мира
+        self.actions = bytearray() if actions is None else bytearray(actions)
+        self.checksum = checksum
+
+    def record(self, actions):
+        self.actions.append(actions)
+
+    def finish(self, world):
+        self.checksum = world.checksum()
+
+    def encode(self):
+        policy = self.enemy_policy.encode()
+        level = (self.level or '').encode()
+        header = REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.seed, len(self.actions),
+                                    self.checksum, len(policy))
+        return (header + policy + LEVEL_FIELD.pack(len(level)) + level +
+                zlib.compress(encode_runs(self.actions), 9))
+
+    @classmethod
+    def decode(cls, data):
+        if len(data) < REPLAY_HEADER.size:
+            raise ReplayError('файл слишком короткий')
+        magic, version, seed, ticks, checksum, policy_length = REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC:
+            raise ReplayError('не файл повтора')
+        if version not in (1, REPLAY_VERSION):
+            raise ReplayError(f'неподдерживаемая версия {version}')
+        offset = REPLAY_HEADER.size
+        policy = data[offset:offset + policy_length].decode()
+        offset += policy_length
+        level = None
+        if version >= 2:
+            (level_length,) = LEVEL_FIELD.unpack_from(data, offset)
+            offset += LEVEL_FIELD.size
+            level = data[offset:offset + level_length].decode() or None
+            offset += level_length
+        actions = decode_runs(zlib.decompress(data[offset:]))
+        if len(actions) != ticks:
+            raise ReplayError(f'ожидалось {ticks} тиков, в потоке {len(actions)}')
+        return cls(seed, policy, actions, checksum, level)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.encode())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.decode(f.read())
+
+class ReplayPlayer:
+    # Воспроизведение повтора в мире ядра, без окна и с любой скоростью
+    def __init__(self, replay, world=None):
+        self.replay = replay
+        self.world = world if world is not None else World()
+        self.world.enemy_policy = ENEMY_POLICIES[replay.enemy_policy]
+        self.level = load_level(replay.level) if replay.level else None
+        self.restart()
+
+    def restart(self):
+        self.world.reset(self.replay.seed, self.level)
+
+    @property
+    def finished(self):
+        return self.world.tick >= len(self.replay.actions) or self.world.done
+
+    def next_actions(self):
+        if self.world.tick < len(self.replay.actions):
+            return self.replay.actions[self.world.tick]
+        return 0
+
+    def step(self):
+        if not self.finished:
+            self.world.step(self.next_actions())
+
+    def seek(self, tick):
+        # Назад можно только через перезапуск; вперед - пересчетом на полной скорости
+        if tick < self.world.tick:
+            self.restart()
+        actions = self.replay.actions
+        world = self.world
+        end = min(tick, len(actions))
+        while world.tick < end and not world.done:
+            world.step(actions[world.tick])
+
+    def run_to_end(self):
+        self.seek(len(self.replay.actions))
+
+    def verify(self):
+        self.run_to_end()
+        return self.world.checksum() == self.replay.checksum
+
+def main():
+    parser = argparse.ArgumentParser(description='Воспроизведение и проверка повторов')
+    parser.add_argument('path', help='файл повтора')
+    parser.add_argument('--to-tick', type=int, default=None, help='перемотать до тика и показать состояние')
+    args = parser.parse_args()
+
+    replay = Replay.load(args.path)
+    player = ReplayPlayer(replay)
+
+    start = time.perf_counter()
+    if args.to_tick is not None:
+        player.seek(args.to_tick)
+        ok = None
+    else:
+        ok = player.verify()
+    elapsed = time.perf_counter() - start
+
+    world = player.world
+    print(f'seed: {replay.seed}, уровень: {replay.level or "встроенный"}, тиков в повторе: {len(replay.actions)}, '
+          f'политика врагов: {replay.enemy_policy}')
+    print(f'тик: {world.tick}, счет: {world.score}, жизни: {world.player_lives}, '
+          f'врагов: {len(world.enemies)}, {world.tick / max(elapsed, 1e-9):.0f} тиков/с')
+    if ok is not None:
+        print('состояние совпадает с записью' if ok else 'РАСХОЖДЕНИЕ: состояние не совпадает с записью')
+        sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import multiprocessing
+import sys
+import time
+
+from core import World
+from policies import PLAYER_POLICIES, ENEMY_POLICIES
+
+# Массовый прогон headless-матчей по всем ядрам.
+# Каждый матч определяется seed и парой политик; результаты приходят
+# потоком по мере готовности в виде компактных записей CSV.
+
+RESULT_HEADER = 'seed,score,lives,ticks,result'
+
+# Мир создается один раз на процесс-воркер и переиспользуется между матчами
+worker_world = None
+worker_config = None
+
+def init_worker(player_policy, enemy_policy, max_ticks, bullet_limit=None):
+    global worker_world, worker_config
+    worker_world = World(enemy_policy=ENEMY_POLICIES[enemy_policy], bullet_limit=bullet_limit)
+    worker_config = (PLAYER_POLICIES[player_policy], max_ticks)
+
+def play_match(seed):
+    world = worker_world
+    make_player, max_ticks = worker_config
+    world.reset(seed)
+    player = make_player(seed)
+
+    while world.tick < max_ticks:
+        if world.step(player(world)):
+            break
+
+    if world.game_won:
+        result = 'win'
+    elif world.game_over:
+        result = 'loss'
+    else:
+        result = 'timeout'
+    return seed, world.score, world.player_lives, world.tick, result
+
+def run_matches(seeds, player_policy, enemy_policy, max_ticks, workers=None, chunksize=64, bullet_limit=None):
+    # Генератор результатов в порядке завершения матчей
+    with multiprocessing.Pool(workers, init_worker, (player_policy, enemy_policy, max_ticks, bullet_limit)) as pool:
+        yield from pool.imap_unordered(play_match, seeds, chunksize)
+
+def main():
+    parser = argparse.ArgumentParser(description='Параллельный прогон headless-матчей')
+    parser.add_argument('--games', type=int, default=1000, help='количество матчей')
+    parser.add_argument('--seed-start', type=int, default=0, help='seed первого матча')
+    parser.add_argument('--player', choices=sorted(PLAYER_POLICIES), default='random')
+    parser.add_argument('--enemy', choices=sorted(ENEMY_POLICIES), default='random')
+    parser.add_argument('--max-ticks', type=int, default=18000, help='лимит тиков на матч (5 минут при 60 тиках/с)')
+    parser.add_argument('--bullet-limit', type=int, default=None,
+                        help='сколько пуль одного танка может быть в полете (по умолчанию без ограничения)')
+    parser.add_argument('--workers', type=int, default=None, help='число процессов (по умолчанию - все ядра)')
+    parser.add_argument('--chunksize', type=int, default=64)
+    parser.add_argument('--out', default='-', help='файл для CSV с результатами (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    out = sys.stdout if args.out == '-' else open(args.out, 'w')
+    seeds = range(args.seed_start, args.seed_start + args.games)
+
+    start = time.perf_counter()
+    games = wins = losses = total_score = total_ticks = 0
+    try:
+        print(RESULT_HEADER, file=out)
+        for seed, score, lives, ticks, result in run_matches(seeds, args.player, args.enemy, args.max_ticks,
+                                                              args.workers, args.chunksize, args.bullet_limit):
+            print(f'{seed},{score},{lives},{ticks},{result}', file=out)
+            games += 1
+            wins += result == 'win'
+            losses += result == 'loss'
+            total_score += score
+            total_ticks += ticks
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    if games:
+        print(f'матчей: {games}, побед: {wins / games:.1%}, поражений: {losses / games:.1%}, '
+              f'средний счет: {total_score / games:.1f}, '
+              f'{games / elapsed:.1f} матчей/с, {total_ticks / elapsed:.0f} тиков/с', file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
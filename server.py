@@ -0,0 +1,143 @@
+import argparse
+import asyncio
+import sys
+import time
+
+from arena import Arena
+from levels import load_level
+from net import MSG_WELCOME, MSG_MAP, MSG_DELTA, WELCOME, DeltaEncoder, encode_map, frame
+from policies import ENEMY_POLICIES
+
+# Сервер сетевой игры: единственный авторитетный мир, фиксированный тик.
+# Клиенты присылают только маски ввода, сервер раз в тик шагает мир,
+# кодирует один снимок-разницу и рассылает его всем. После конца раунда
+# сервер ждет round_pause тиков и начинает новый с новым seed.
+
+# Клиент, у которого в очереди на отправку больше этого, отключается
+MAX_SEND_BUFFER = 1 << 20
+
+class Client:
+    def __init__(self, slot, writer):
+        self.slot = slot
+        self.writer = writer
+        self.actions = 0
+
+class Server:
+    def __init__(self, arena, level=None, seed=0, tick_rate=60, round_pause=180):
+        self.arena = arena
+        self.level = level
+        self.seed = seed
+        self.tick_rate = tick_rate
+        self.round_pause = round_pause
+        self.encoder = DeltaEncoder(arena)
+        self.clients = {}
+        self.round = 0
+        self.pause = 0
+        # Статистика: тики, байты снимков, время шага и кодирования
+        self.ticks = 0
+        self.delta_bytes = 0
+        self.tick_seconds = 0.0
+        self.start_round()
+
+    def start_round(self):
+        self.arena.reset(self.seed + self.round, self.level)
+        self.round += 1
+        self.pause = 0
+        self.encoder.restart()
+        self.broadcast(frame(MSG_MAP, encode_map(self.arena.grid)))
+
+    def broadcast(self, data):
+        for client in list(self.clients.values()):
+            client.writer.write(data)
+            if client.writer.transport.get_write_buffer_size() > MAX_SEND_BUFFER:
+                # Медленный клиент не должен копить память сервера
+                client.writer.close()
+
+    async def handle(self, reader, writer):
+        slot = self.arena.join()
+        if slot is None:
+            writer.close()
+            return
+        client = self.clients[slot] = Client(slot, writer)
+        writer.write(frame(MSG_WELCOME, WELCOME.pack(slot, self.tick_rate)) +
+                     frame(MSG_MAP, encode_map(self.arena.grid)) +
+                     frame(MSG_DELTA, self.encoder.full()))
+        try:
+            while True:
+                data = await reader.read(256)
+                if not data:
+                    break
+                # Важна только последняя маска
+                client.actions = data[-1]
+        except ConnectionError:
+            pass
+        finally:
+            del self.clients[slot]
+            self.arena.leave(slot)
+            writer.close()
+
+    def tick(self):
+        start = time.perf_counter()
+        arena = self.arena
+        if arena.done:
+            self.pause += 1
+            if self.pause >= self.round_pause:
+                self.start_round()
+                return
+        else:
+            arena.step({slot: client.actions for slot, client in self.clients.items()})
+        data = frame(MSG_DELTA, self.encoder.encode())
+        self.tick_seconds += time.perf_counter() - start
+        self.ticks += 1
+        self.delta_bytes += len(data)
+        self.broadcast(data)
+
+    async def run(self, ticks=None):
+        # Мир стоит, пока никого нет; тики идут по часам цикла событий без накопления ошибки
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / self.tick_rate
+        next_tick = loop.time()
+        while ticks is None or self.ticks < ticks:
+            if self.clients:
+                self.tick()
+            next_tick += interval
+            delay = next_tick - loop.time()
+            if delay < -interval:
+                # Сильно отстали - не пытаемся догнать пачкой тиков
+                next_tick = loop.time()
+                delay = 0
+            await asyncio.sleep(max(0.0, delay))
+
+    def report(self):
+        # Каждый клиент получает один и тот же снимок, поэтому поток на клиента - размер снимка
+        ticks = max(self.ticks, 1)
+        per_client = self.delta_bytes / ticks
+        return (f'тиков: {self.ticks}, шаг и кодирование: {self.tick_seconds / ticks * 1000:.3f} мс/тик, '
+                f'на клиента: {per_client:.1f} байт/тик ({per_client * self.tick_rate / 1024:.1f} КБ/с)')
+
+async def serve(server, host, port, ticks=None):
+    listener = await asyncio.start_server(server.handle, host, port)
+    async with listener:
+        await server.run(ticks)
+
+def main():
+    parser = argparse.ArgumentParser(description='Сервер сетевой игры')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('--level', default=None, help='файл уровня (по умолчанию встроенная карта)')
+    parser.add_argument('--enemy', choices=sorted(ENEMY_POLICIES), default='random')
+    parser.add_argument('--max-players', type=int, default=4)
+    parser.add_argument('--tick-rate', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=0, help='seed первого раунда, дальше +1 за раунд')
+    args = parser.parse_args()
+
+    arena = Arena(args.max_players, enemy_policy=ENEMY_POLICIES[args.enemy])
+    server = Server(arena, load_level(args.level) if args.level else None, args.seed, args.tick_rate)
+    print(f'сервер слушает {args.host}:{args.port}', file=sys.stderr)
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        print(server.report(), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+from core import TILE_SIZE, BULLET_SIZE, BULLET_BLOCKING
+
+# Прямая видимость для прицельной стрельбы. Для каждого ряда и каждой
+# колонки поля хранится целое число - битовая маска клеток, которые
+# останавливают пули (кирпич и сталь). Проверка "между врагом и игроком
+# нет стен" - одна операция AND с маской диапазона вместо прохода по
+# клеткам. Маски строятся один раз на карту и правятся подписчиком
+# сетки, когда пуля разрушает кирпич.
+
+# bytes.translate: тип клетки -> b'1', если клетка останавливает пулю
+BLOCKING_DIGITS = bytes(ord('1') if i < len(BULLET_BLOCKING) and BULLET_BLOCKING[i] else ord('0')
+                        for i in range(256))
+
+def span_mask(first, last):
+    # Биты с first по last включительно
+    return ((1 << (last + 1)) - 1) ^ ((1 << first) - 1)
+
+class SightLines:
+    def __init__(self, grid):
+        self.grid = grid
+        self.generation = None
+        self.row_masks = []
+        self.col_masks = []
+        grid.listeners.append(self.on_tile_cleared)
+
+    def sync(self):
+        grid = self.grid
+        if self.generation == grid.generation:
+            return
+        self.generation = grid.generation
+        cols = grid.cols
+        tiles = bytes(grid.tiles)
+        # Младший бит - колонка (ряд) 0, поэтому строка цифр разворачивается
+        self.row_masks = [int(tiles[row * cols:(row + 1) * cols].translate(BLOCKING_DIGITS)[::-1], 2)
+                          for row in range(grid.rows)]
+        self.col_masks = [int(tiles[col::cols].translate(BLOCKING_DIGITS)[::-1], 2) for col in range(cols)]
+
+    def on_tile_cleared(self, col, row, old_tile):
+        if self.generation != self.grid.generation or not BULLET_BLOCKING[old_tile]:
+            return
+        self.row_masks[row] &= ~(1 << col)
+        self.col_masks[col] &= ~(1 << row)
+
+    def row_clear(self, row, first, last):
+        return first > last or not self.row_masks[row] & span_mask(first, last)
+
+    def column_clear(self, col, first, last):
+        return first > last or not self.col_masks[col] & span_mask(first, last)
+
+def line_of_fire(world, enemy):
+    # Направление выстрела, пуля которого долетит до игрока; None - игрок не на линии или закрыт стеной
+    sight = world.sight_lines
+    if sight is None:
+        sight = world.sight_lines = SightLines(world.grid)
+    sight.sync()
+    player = world.player
+
+    # Выстрел по вертикали: полоса шириной в пулю по центру танка
+    left = enemy.x + enemy.width // 2 - BULLET_SIZE // 2
+    if left < player.x + player.width and player.x < left + BULLET_SIZE:
+        if player.y < enemy.y:
+            direction, first, last = 0, (player.y + player.height) // TILE_SIZE, (enemy.y - 1) // TILE_SIZE
+        else:
+            direction, first, last = 2, (enemy.y + enemy.height) // TILE_SIZE, (player.y - 1) // TILE_SIZE
+        for col in range(left // TILE_SIZE, (left + BULLET_SIZE - 1) // TILE_SIZE + 1):
+            if not sight.column_clear(col, first, last):
+                return None
+        return direction
+
+    top = enemy.y + enemy.height // 2 - BULLET_SIZE // 2
+    if top < player.y + player.height and player.y < top + BULLET_SIZE:
+        if player.x < enemy.x:
+            direction, first, last = 3, (player.x + player.width) // TILE_SIZE, (enemy.x - 1) // TILE_SIZE
+        else:
+            direction, first, last = 1, (enemy.x + enemy.width) // TILE_SIZE, (player.x - 1) // TILE_SIZE
+        for row in range(top // TILE_SIZE, (top + BULLET_SIZE - 1) // TILE_SIZE + 1):
+            if not sight.row_clear(row, first, last):
+                return None
+        return direction
+    return None
@@ -0,0 +1,273 @@
+import argparse
+import os
+import struct
+import sys
+
+import numpy as np
+
+from core import TILE_SIZE, Tank, World
+from flowfield import FlowField
+from levels import load_level
+from policies import ENEMY_POLICIES, random_player
+
+# Снимок полного состояния мира в плоский буфер байтов и обратно - для
+# быстрого сохранения, отката на несколько тиков назад и перебора ходов,
+# когда один мир восстанавливают из снимка тысячи раз.
+#
+# Формат: заголовок, состояние генератора случайных чисел, записи танков
+# (игроки, затем враги), клетки поля, живая часть массивов пуль как есть
+# (tobytes) и поле преследования, если политика врагов его завела.
+# Объекты Tank и пули в буфер не попадают, только числа.
+#
+# Снимок описывает мир внутри одного уровня: объект уровня (world.level) и
+# политика врагов не сохраняются. Кэши по сетке (маски стен, чанки
+# отрисовки) пересобираются, только если клетки в снимке отличаются от
+# текущих. Поле преследования - не кэш: поиск в нем идет порциями по
+# нескольку тиков, и от незаконченного поиска зависят ходы врагов, поэтому
+# расстояния и кучи поиска сохраняются как есть. На карте 256x256 это
+# около 0.5 МБ к снимку, пока идет поиск - вдвое больше.
+
+# тик, счет, жизни, конец игры, победа, предыдущая маска ввода, seed,
+# ширина и высота поля в клетках, число танков, число пуль, следующий номер выстрела,
+# размер записи поля преследования (0 - поля нет)
+SNAPSHOT_HEADER = struct.Struct('<IiiBBBQHHHIQI')
+# состояние Mersenne Twister: 624 слова и позиция, затем gauss_next
+RNG_STATE = struct.Struct('<625I')
+RNG_GAUSS = struct.Struct('<Bd')
+# номер, x, y, направление, танк игрока, тик перезарядки
+TANK_RECORD = struct.Struct('<HiiBBi')
+# цель поля и цель незаконченного поиска (-1 - нет), длины куч уточнения и поиска;
+# затем расстояния поля, расстояния поиска и кучи парами (расстояние, узел) в float64
+FIELD_HEADER = struct.Struct('<iiiiII')
+
+class SnapshotError(Exception):
+    pass
+
+def save(world):
+    tanks = world.players + world.enemies
+    grid = world.grid
+    bullets = world.bullets
+    n = bullets.count
+    field = save_field(world)
+    version, state, gauss = world.rng.getstate()
+    parts = [
+        SNAPSHOT_HEADER.pack(world.tick, world.score, world.player_lives, world.game_over, world.game_won,
+                             world.prev_actions, world.seed, grid.cols, grid.rows, len(tanks), n,
+                             bullets.next_serial, len(field)),
+        RNG_STATE.pack(*state),
+        RNG_GAUSS.pack(gauss is not None, gauss or 0.0),
+        b''.join([TANK_RECORD.pack(tank.id, tank.x, tank.y, tank.direction, tank.is_player, tank.reload_tick)
+                  for tank in tanks]),
+        bytes(grid.tiles),
+    ]
+    parts.extend(array[:n].tobytes() for array in bullets.arrays())
+    parts.append(field)
+    return b''.join(parts)
+
+def save_field(world):
+    # Поле, которое еще не строилось для текущей карты, пересоберется при
+    # первом обращении, и сохранять в нем нечего
+    field = world.flow_field
+    if field is None or field.generation != world.grid.generation:
+        return b''
+    goal = field.goal or (-1, -1)
+    search_goal = field.search_goal or (-1, -1)
+    parts = [
+        FIELD_HEADER.pack(*goal, *search_goal, len(field.repair_heap), len(field.search_heap)),
+        np.array(field.distance, dtype=np.float64).tobytes(),
+    ]
+    if field.search_goal is not None:
+        parts.append(np.array(field.search_distance, dtype=np.float64).tobytes())
+    for heap in (field.repair_heap, field.search_heap):
+        if heap:
+            parts.append(np.array(heap, dtype=np.float64).tobytes())
+    return b''.join(parts)
+
+def restore(world, data):
+    (tick, score, player_lives, game_over, game_won, prev_actions, seed, cols, rows,
+     tank_count, n, next_serial, field_size) = SNAPSHOT_HEADER.unpack_from(data)
+    bullets = world.bullets
+    if n > bullets.capacity:
+        raise SnapshotError(f'в снимке {n} пуль, в пуле мира места на {bullets.capacity}')
+    bullet_size = sum(array.itemsize for array in bullets.arrays())
+    size = (SNAPSHOT_HEADER.size + RNG_STATE.size + RNG_GAUSS.size + tank_count * TANK_RECORD.size +
+            cols * rows + n * bullet_size + field_size)
+    if len(data) != size:
+        raise SnapshotError(f'размер снимка {len(data)} байт, по заголовку должно быть {size}')
+
+    world.tick = tick
+    world.score = score
+    world.player_lives = player_lives
+    world.game_over = bool(game_over)
+    world.game_won = bool(game_won)
+    world.prev_actions = prev_actions
+    world.seed = seed
+    offset = SNAPSHOT_HEADER.size
+
+    state = RNG_STATE.unpack_from(data, offset)
+    offset += RNG_STATE.size
+    has_gauss, gauss = RNG_GAUSS.unpack_from(data, offset)
+    offset += RNG_GAUSS.size
+    world.rng.setstate((3, state, gauss if has_gauss else None))
+
+    # Танки создаются заново: убитые после снимка враги должны вернуться
+    players = []
+    enemies = []
+    end = offset + tank_count * TANK_RECORD.size
+    for number, x, y, direction, is_player, reload_tick in TANK_RECORD.iter_unpack(data[offset:end]):
+        tank = Tank(x, y, bool(is_player))
+        tank.id = number
+        tank.direction = direction
+        tank.reload_tick = reload_tick
+        (players if is_player else enemies).append(tank)
+    offset = end
+    world.players = players
+    world.player = players[0] if players else None
+    world.enemies = enemies
+    world.tank_index.rebuild(players + enemies)
+
+    grid = world.grid
+    if (grid.cols, grid.rows) != (cols, rows):
+        grid.resize(cols, rows)
+        world.width = cols * TILE_SIZE
+        world.height = rows * TILE_SIZE
+    end = offset + cols * rows
+    tiles = memoryview(data)[offset:end]
+    # Совпадающие клетки не трогаем, чтобы не сбрасывать кэши по сетке
+    if grid.tiles != tiles:
+        grid.load(tiles)
+    offset = end
+
+    for array in bullets.arrays():
+        array[:n] = np.frombuffer(data, dtype=array.dtype, count=n, offset=offset)
+        offset += n * array.itemsize
+    bullets.count = n
+    bullets.next_serial = next_serial
+    restore_field(world, memoryview(data)[offset:])
+
+def restore_field(world, data):
+    field = world.flow_field
+    if not data:
+        # Поля в снимке нет: следующее обращение построит его заново, как в мире без поля
+        if field is not None:
+            field.generation = None
+            field.step = None
+        return
+    if field is None:
+        field = world.flow_field = FlowField(world.grid)
+    goal_col, goal_row, search_col, search_row, repair_length, search_length = FIELD_HEADER.unpack_from(data)
+    nodes = world.grid.cols * world.grid.rows
+    searching = search_col >= 0
+    size = FIELD_HEADER.size + 8 * (nodes * (1 + searching) + 2 * (repair_length + search_length))
+    if len(data) != size:
+        raise SnapshotError(f'размер записи поля преследования {len(data)} байт, должно быть {size}')
+    # Стоимости узлов - функция клеток; при тех же клетках текущие верны
+    if field.generation != world.grid.generation:
+        field.rebuild()
+    offset = FIELD_HEADER.size
+    field.goal = (goal_col, goal_row) if goal_col >= 0 else None
+    field.distance = np.frombuffer(data, dtype=np.float64, count=nodes, offset=offset).tolist()
+    offset += 8 * nodes
+    if searching:
+        field.search_goal = (search_col, search_row)
+        field.search_distance = np.frombuffer(data, dtype=np.float64, count=nodes, offset=offset).tolist()
+        offset += 8 * nodes
+    else:
+        field.search_goal = None
+        field.search_distance = None
+    heaps = []
+    for length in (repair_length, search_length):
+        pairs = np.frombuffer(data, dtype=np.float64, count=2 * length, offset=offset).reshape(length, 2).tolist()
+        heaps.append([(distance, int(index)) for distance, index in pairs])
+        offset += 16 * length
+    field.repair_heap, field.search_heap = heaps
+    # Шаг после восстановления всегда новый для поля
+    field.step = None
+
+class SnapshotRing:
+    # Снимки последних capacity тиков; ячейка выбирается по номеру тика
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.ticks = [None] * capacity
+        self.snapshots = [None] * capacity
+
+    def push(self, world):
+        index = world.tick % self.capacity
+        self.ticks[index] = world.tick
+        self.snapshots[index] = save(world)
+
+    def get(self, tick):
+        # Снимок на начало тика tick или None, если он уже вытеснен
+        index = tick % self.capacity
+        if self.ticks[index] != tick:
+            return None
+        return self.snapshots[index]
+
+    def rewind(self, world, tick):
+        data = self.get(tick)
+        if data is None:
+            return False
+        restore(world, data)
+        # Более поздние снимки относятся к отмененному будущему
+        for index, saved in enumerate(self.ticks):
+            if saved is not None and saved > tick:
+                self.ticks[index] = None
+                self.snapshots[index] = None
+        return True
+
+    def clear(self):
+        self.ticks = [None] * self.capacity
+        self.snapshots = [None] * self.capacity
+
+def check_rollback(enemy_policy, seed, ticks, level=None, fresh_every=50):
+    # Прямой прогон против прогона, где каждый тик делается дважды: снимок,
+    # шаг, восстановление, шаг. Раз в fresh_every тиков второй мир заменяется
+    # новым, восстановленным из снимка. Возвращает первый тик с расхождением
+    # контрольных сумм или None
+    straight = World(enemy_policy=ENEMY_POLICIES[enemy_policy])
+    straight.reset(seed, level)
+    rolled = World(enemy_policy=ENEMY_POLICIES[enemy_policy])
+    rolled.reset(seed, level)
+    player = random_player(seed)
+    for tick in range(ticks):
+        actions = player(straight)
+        data = save(rolled)
+        rolled.step(actions)
+        if tick % fresh_every == 0:
+            rolled = World(enemy_policy=ENEMY_POLICIES[enemy_policy])
+            rolled.level = level
+        restore(rolled, data)
+        rolled.step(actions)
+        done = straight.step(actions)
+        if rolled.checksum() != straight.checksum():
+            return tick
+        if done:
+            break
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Проверка отката: снимок и восстановление на каждом тике '
+                                                 'против прямого прогона, для всех политик врагов')
+    parser.add_argument('--seeds', type=int, default=10, help='число seed на политику и карту')
+    parser.add_argument('--ticks', type=int, default=600)
+    parser.add_argument('--level', action='append', default=None,
+                        help='файл уровня (можно несколько); по умолчанию встроенная карта и levels/04.txt')
+    args = parser.parse_args()
+
+    sources = args.level or [None, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'levels', '04.txt')]
+    failures = 0
+    for source in sources:
+        level = load_level(source) if source else None
+        for name in sorted(ENEMY_POLICIES):
+            diverged = []
+            for seed in range(args.seeds):
+                tick = check_rollback(name, seed, args.ticks, level)
+                if tick is not None:
+                    diverged.append(f'{seed}@{tick}')
+            failures += len(diverged)
+            print(f'{source or "встроенная карта"}, {name}: '
+                  f'{"совпадает" if not diverged else "РАСХОЖДЕНИЕ (seed@тик): " + " ".join(diverged)}')
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+import argparse
+import time
+
+import numpy as np
+
+from core import (
+    TILE_SIZE, TANK_SIZE, BULLET_SIZE, BULLET_SPEED, PLAYER_SPEED, ENEMY_SPEED,
+    PLAYER_LIVES, ENEMY_SCORE, BRICK, TANK_BLOCKING, BULLET_BLOCKING,
+    ACTION_MOVE, ACTION_FIRE, World,
+)
+
+# Пакетное окружение: K независимых миров в общих массивах numpy.
+# Правила те же, что в core.World: танки по очереди двигаются и
+# откатываются при столкновении, враги случайно поворачивают и стреляют,
+# пули гаснут о стены, разрушают кирпич и убивают танки. Одновременные
+# попадания нескольких пуль в одну цель за тик разбираются по номеру слота.
+# Стены, как в ядре: сначала пули игрока, затем врагов, и каждая пуля
+# проверяется по клеткам с учетом кирпича, уже разрушенного за этот тик.
+
+DX = np.array([0, 1, 0, -1], dtype=np.int32)
+DY = np.array([-1, 0, 1, 0], dtype=np.int32)
+TANK_BLOCKING_TABLE = np.frombuffer(TANK_BLOCKING, dtype=np.uint8).astype(bool)
+BULLET_BLOCKING_TABLE = np.frombuffer(BULLET_BLOCKING, dtype=np.uint8).astype(bool)
+
+# Смещение точки вылета пули от левого верхнего угла танка по направлениям
+MUZZLE_X = np.array([TANK_SIZE // 2 - 3, TANK_SIZE, TANK_SIZE // 2 - 3, -6], dtype=np.int32)
+MUZZLE_Y = np.array([-6, TANK_SIZE // 2 - 3, TANK_SIZE, TANK_SIZE // 2 - 3], dtype=np.int32)
+
+# Приоритет поворота при одновременном нажатии, как у клавиш W, A, S, D
+TURN_PRIORITY = (0, 3, 2, 1)
+
+class VecBattleCity:
+    def __init__(self, num_worlds, bullet_slots=64, max_ticks=None, autoreset=True):
+        # Шаблон уровня и стартовые позиции берутся из обычного мира ядра
+        template = World()
+        template.reset(0)
+        self.cols = template.grid.cols
+        self.rows = template.grid.rows
+        self.width = template.width
+        self.height = template.height
+        self.level = np.frombuffer(bytes(template.grid.tiles), dtype=np.uint8)
+        spawn = [template.player] + template.enemies
+        self.spawn_x = np.array([tank.x for tank in spawn], dtype=np.int32)
+        self.spawn_y = np.array([tank.y for tank in spawn], dtype=np.int32)
+
+        self.num_worlds = num_worlds
+        self.num_tanks = len(spawn)
+        self.bullet_slots = bullet_slots
+        self.max_ticks = max_ticks
+        self.autoreset = autoreset
+        self.rng = np.random.default_rng()
+
+        k, t, b = num_worlds, self.num_tanks, bullet_slots
+        self.world_index = np.arange(k)
+
+        self.tiles = np.zeros((k, self.rows * self.cols), dtype=np.uint8)
+
+        # Танк 0 - игрок, остальные - враги
+        self.tank_x = np.zeros((k, t), dtype=np.int32)
+        self.tank_y = np.zeros((k, t), dtype=np.int32)
+        self.tank_dir = np.zeros((k, t), dtype=np.int8)
+        self.tank_alive = np.zeros((k, t), dtype=bool)
+        self.tank_speed = np.full(t, ENEMY_SPEED, dtype=np.int32)
+        self.tank_speed[0] = PLAYER_SPEED
+
+        self.bullet_x = np.zeros((k, b), dtype=np.int32)
+        self.bullet_y = np.zeros((k, b), dtype=np.int32)
+        self.bullet_dir = np.zeros((k, b), dtype=np.int8)
+        self.bullet_is_player = np.zeros((k, b), dtype=bool)
+        self.bullet_active = np.zeros((k, b), dtype=bool)
+
+        self.score = np.zeros(k, dtype=np.int32)
+        self.lives = np.zeros(k, dtype=np.int32)
+        self.game_over = np.zeros(k, dtype=bool)
+        self.game_won = np.zeros(k, dtype=bool)
+        self.ticks = np.zeros(k, dtype=np.int32)
+        self.prev_actions = np.zeros(k, dtype=np.int32)
+
+        # Буферы наблюдений переиспользуются между шагами
+        self.obs_tanks = np.zeros((k, t, 4), dtype=np.int32)
+        self.obs_bullets = np.zeros((k, b, 5), dtype=np.int32)
+
+    @property
+    def nbytes(self):
+        return sum(value.nbytes for value in vars(self).values() if isinstance(value, np.ndarray))
+
+    def reset(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.reset_worlds(np.ones(self.num_worlds, dtype=bool))
+        return self.observe()
+
+    def reset_worlds(self, mask):
+        self.tiles[mask] = self.level
+        self.tank_x[mask] = self.spawn_x
+        self.tank_y[mask] = self.spawn_y
+        self.tank_dir[mask] = 0
+        self.tank_alive[mask] = True
+        self.bullet_active[mask] = False
+        self.score[mask] = 0
+        self.lives[mask] = PLAYER_LIVES
+        self.game_over[mask] = False
+        self.game_won[mask] = False
+        self.ticks[mask] = 0
+        self.prev_actions[mask] = 0
+
+    def observe(self):
+        tanks = self.obs_tanks
+        tanks[..., 0] = self.tank_x
+        tanks[..., 1] = self.tank_y
+        tanks[..., 2] = self.tank_dir
+        tanks[..., 3] = self.tank_alive
+        bullets = self.obs_bullets
+        bullets[..., 0] = self.bullet_x
+        bullets[..., 1] = self.bullet_y
+        bullets[..., 2] = self.bullet_dir
+        bullets[..., 3] = self.bullet_is_player
+        bullets[..., 4] = self.bullet_active
+        return {
+            'tiles': self.tiles.reshape(self.num_worlds, self.rows, self.cols),
+            'tanks': tanks,
+            'bullets': bullets,
+        }
+
+    def tank_blocked(self, x, y):
+        # Танк 24x24 перекрывает не больше 3x3 клеток
+        col0 = x // TILE_SIZE
+        row0 = y // TILE_SIZE
+        col2 = (x + TANK_SIZE - 1) // TILE_SIZE
+        row2 = (y + TANK_SIZE - 1) // TILE_SIZE
+        col1 = np.minimum(col0 + 1, col2)
+        row1 = np.minimum(row0 + 1, row2)
+        blocked = np.zeros(len(x), dtype=bool)
+        for row in (row0, row1, row2):
+            base = row * self.cols
+            for col in (col0, col1, col2):
+                blocked |= TANK_BLOCKING_TABLE[self.tiles[self.world_index, base + col]]
+        return blocked
+
+    def tank_overlaps_others(self, i, x, y):
+        # Столкновение танка i с остальными живыми танками каждого мира
+        others = (self.tank_alive &
+                  (self.tank_x < x[:, None] + TANK_SIZE) & (x[:, None] < self.tank_x + TANK_SIZE) &
+                  (self.tank_y < y[:, None] + TANK_SIZE) & (y[:, None] < self.tank_y + TANK_SIZE))
+        others[:, i] = False
+        return others.any(axis=1)
+
+    def move_tank(self, i, mask):
+        old_x = self.tank_x[:, i].copy()
+        old_y = self.tank_y[:, i].copy()
+        direction = self.tank_dir[:, i]
+        speed = self.tank_speed[i]
+        x = np.clip(old_x + DX[direction] * speed, 0, self.width - TANK_SIZE)
+        y = np.clip(old_y + DY[direction] * speed, 0, self.height - TANK_SIZE)
+        x = np.where(mask, x, old_x)
+        y = np.where(mask, y, old_y)
+        self.tank_x[:, i] = x
+        self.tank_y[:, i] = y
+        collided = mask & (self.tank_blocked(x, y) | self.tank_overlaps_others(i, x, y))
+        self.tank_x[:, i] = np.where(collided, old_x, x)
+        self.tank_y[:, i] = np.where(collided, old_y, y)
+        return collided
+
+    def spawn_bullets(self, i, mask):
+        # Пуля занимает первый свободный слот; без свободных слотов выстрел пропадает
+        free = ~self.bullet_active
+        slot = free.argmax(axis=1)
+        mask = mask & free[self.world_index, slot]
+        worlds = self.world_index[mask]
+        slot = slot[mask]
+        direction = self.tank_dir[worlds, i]
+        self.bullet_x[worlds, slot] = self.tank_x[worlds, i] + MUZZLE_X[direction]
+        self.bullet_y[worlds, slot] = self.tank_y[worlds, i] + MUZZLE_Y[direction]
+        self.bullet_dir[worlds, slot] = direction
+        self.bullet_is_player[worlds, slot] = i == 0
+        self.bullet_active[worlds, slot] = True
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.int32)
+        live = ~(self.game_over | self.game_won)
+        score_before = self.score.copy()
+        lives_before = self.lives.copy()
+
+        # Ввод игрока: новое нажатие поворачивает, удержание двигает
+        pressed = actions & ~self.prev_actions & np.where(live, -1, 0)
+        self.prev_actions[:] = actions
+        for direction in reversed(TURN_PRIORITY):
+            turn = (pressed & (1 << direction)) != 0
+            self.tank_dir[:, 0] = np.where(turn, direction, self.tank_dir[:, 0])
+        self.spawn_bullets(0, (pressed & ACTION_FIRE) != 0)
+        self.move_tank(0, live & ((actions & ACTION_MOVE) != 0))
+
+        # Враги по очереди, как в update_enemies
+        enemies = self.num_tanks - 1
+        turn_roll = self.rng.random((self.num_worlds, enemies))
+        fire_roll = self.rng.random((self.num_worlds, enemies))
+        new_dir = self.rng.integers(0, 4, (self.num_worlds, enemies), dtype=np.int8)
+        for i in range(1, self.num_tanks):
+            moving = live & self.tank_alive[:, i]
+            collided = self.move_tank(i, moving)
+            turn = collided | (moving & (turn_roll[:, i - 1] < 0.01))
+            self.tank_dir[:, i] = np.where(turn, new_dir[:, i - 1], self.tank_dir[:, i])
+            self.spawn_bullets(i, moving & (fire_roll[:, i - 1] < 0.01))
+
+        self.update_bullets(live)
+        self.check_collisions(live)
+
+        self.ticks += live
+        done = self.game_over | self.game_won
+        if self.max_ticks is not None:
+            done = done | (self.ticks >= self.max_ticks)
+        reward = ((self.score - score_before) // ENEMY_SCORE - (lives_before - self.lives)).astype(np.float32)
+
+        if self.autoreset and done.any():
+            self.reset_worlds(done)
+        return self.observe(), reward, done
+
+    def update_bullets(self, live):
+        worlds, slots = np.nonzero(self.bullet_active & live[:, None])
+        direction = self.bullet_dir[worlds, slots]
+        x = self.bullet_x[worlds, slots] + DX[direction] * BULLET_SPEED
+        y = self.bullet_y[worlds, slots] + DY[direction] * BULLET_SPEED
+        self.bullet_x[worlds, slots] = x
+        self.bullet_y[worlds, slots] = y
+        self.bullet_active[worlds, slots] = (x >= 0) & (x <= self.width) & (y >= 0) & (y <= self.height)
+
+    def check_collisions(self, live):
+        # Работаем только с активными пулями, развернутыми в плоский список
+        worlds, slots = np.nonzero(self.bullet_active & live[:, None])
+        if len(worlds) == 0:
+            return
+        bx = self.bullet_x[worlds, slots]
+        by = self.bullet_y[worlds, slots]
+        is_player = self.bullet_is_player[worlds, slots]
+        tx = self.tank_x[worlds]
+        ty = self.tank_y[worlds]
+        # Матрица (пуля, танк)
+        hits = ((bx[:, None] < tx + TANK_SIZE) & (tx < bx[:, None] + BULLET_SIZE) &
+                (by[:, None] < ty + TANK_SIZE) & (ty < by[:, None] + BULLET_SIZE) &
+                self.tank_alive[worlds])
+        active = np.ones(len(worlds), dtype=bool)
+
+        # Пули игрока с врагами: каждая пуля убивает первого задетого врага
+        player_hits = hits[:, 1:] & is_player[:, None]
+        hit = np.flatnonzero(player_hits.any(axis=1))
+        if len(hit):
+            targets = player_hits[hit].argmax(axis=1) + 1
+            # Из нескольких пуль в одного врага засчитывается пуля с меньшим слотом
+            _, first = np.unique(worlds[hit] * self.num_tanks + targets, return_index=True)
+            hit = hit[first]
+            targets = targets[first]
+            active[hit] = False
+            self.tank_alive[worlds[hit], targets] = False
+            np.add.at(self.score, worlds[hit], ENEMY_SCORE)
+            self.game_won |= ~self.tank_alive[:, 1:].any(axis=1)
+
+        # Пули врагов с игроком
+        enemy_hits = hits[:, 0] & active & ~is_player
+        active &= ~enemy_hits
+        np.subtract.at(self.lives, worlds[enemy_hits], 1)
+        self.game_over |= self.lives <= 0
+
+        # Пули со стенами. Клетки за тик только расчищаются, так что кандидаты -
+        # пули, задевающие стену до разрушений. Их разбираем по порядку ядра:
+        # в каждом мире пули игрока, затем врагов, внутри - по слоту; за проход
+        # берется первая оставшаяся пуля каждого мира и проверяется заново, ведь
+        # кирпич под ней могла разрушить предыдущая
+        pending = np.flatnonzero(active & (self.wall_cell(worlds, bx, by) >= 0))
+        pending = pending[np.lexsort((slots[pending], ~is_player[pending], worlds[pending]))]
+        while len(pending):
+            first = np.ones(len(pending), dtype=bool)
+            first[1:] = worlds[pending[1:]] != worlds[pending[:-1]]
+            now = pending[first]
+            pending = pending[~first]
+            cell = self.wall_cell(worlds[now], bx[now], by[now])
+            wall_hit = cell >= 0
+            now = now[wall_hit]
+            cell = cell[wall_hit]
+            active[now] = False
+            hit_worlds = worlds[now]
+            bricks = self.tiles[hit_worlds, cell] == BRICK
+            self.tiles[hit_worlds[bricks], cell[bricks]] = 0
+        self.bullet_active[worlds, slots] = active
+
+    def wall_cell(self, worlds, bx, by):
+        # Первая по порядку блокирующая клетка из четырех углов пули или -1
+        col0 = np.minimum(bx // TILE_SIZE, self.cols - 1)
+        col1 = np.minimum((bx + BULLET_SIZE - 1) // TILE_SIZE, self.cols - 1)
+        row0 = np.minimum(by // TILE_SIZE, self.rows - 1) * self.cols
+        row1 = np.minimum((by + BULLET_SIZE - 1) // TILE_SIZE, self.rows - 1) * self.cols
+        cell = np.full(len(worlds), -1, dtype=np.int64)
+        for corner in (row1 + col1, row1 + col0, row0 + col1, row0 + col0):
+            blocking = BULLET_BLOCKING_TABLE[self.tiles[worlds, corner]]
+            cell = np.where(blocking, corner, cell)
+        return cell
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер пропускной способности пакетного окружения')
+    parser.add_argument('--worlds', type=int, default=1024)
+    parser.add_argument('--steps', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    env = VecBattleCity(args.worlds, max_ticks=3000)
+    env.reset(args.seed)
+    rng = np.random.default_rng(args.seed)
+    actions = rng.integers(0, 32, (args.steps, args.worlds), dtype=np.int32)
+
+    start = time.perf_counter()
+    for step in range(args.steps):
+        env.step(actions[step])
+    elapsed = time.perf_counter() - start
+
+    print(f'миров: {args.worlds}, шагов: {args.steps}, память: {env.nbytes / 1024:.0f} КБ')
+    print(f'{args.worlds * args.steps / elapsed:.0f} мир-шагов/с')
+
+if __name__ == '__main__':
+    main()